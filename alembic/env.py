@@ -5,6 +5,7 @@ from sqlalchemy import engine_from_config, pool
 from alembic import context
 from core.config import settings
 from core.models import Base
+from core.partitions import is_partition_name
 
 config = context.config
 
@@ -16,11 +17,18 @@ config.set_main_option('sqlalchemy.url', settings.ALEMBIC_SYNC_DB_URL)
 target_metadata = Base.metadata
 
 
+def include_name(name, type_, parent_names) -> bool:
+    if type_ == 'table':
+        return not is_partition_name(name)
+    return True
+
+
 def run_migrations_offline() -> None:
     url = config.get_main_option("sqlalchemy.url")
     context.configure(
         url=url,
         target_metadata=target_metadata,
+        include_name=include_name,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
     )
@@ -38,7 +46,8 @@ def run_migrations_online() -> None:
 
     with connectable.connect() as connection:
         context.configure(
-            connection=connection, target_metadata=target_metadata
+            connection=connection, target_metadata=target_metadata,
+            include_name=include_name
         )
 
         with context.begin_transaction():
@@ -0,0 +1,40 @@
+"""Trading days
+
+Revision ID: 32530490efab
+Revises: ffe35cc80da6
+Create Date: 2026-10-17 12:20:51.660318
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '32530490efab'
+down_revision: Union[str, None] = 'ffe35cc80da6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('trading_days',
+    sa.Column('date', sa.Date(), nullable=False),
+    sa.Column('row_count', sa.Integer(), nullable=False),
+    sa.Column('total_volume', sa.BigInteger(), nullable=False),
+    sa.Column('total_value', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('date')
+    )
+    op.execute(
+        'INSERT INTO trading_days '
+        '(date, row_count, total_volume, total_value) '
+        'SELECT date, count(*), sum(volume), sum(total) '
+        'FROM spimex_trading_results GROUP BY date'
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('trading_days')
@@ -0,0 +1,40 @@
+"""Natural key
+
+Revision ID: 326cc00190b1
+Revises: 7b74c0042a83
+Create Date: 2026-10-17 11:02:09.514877
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '326cc00190b1'
+down_revision: Union[str, None] = '7b74c0042a83'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute(
+        'DELETE FROM spimex_trading_results AS old '
+        'USING spimex_trading_results AS new '
+        'WHERE old.date = new.date '
+        'AND old.exchange_product_id = new.exchange_product_id '
+        'AND old.id < new.id'
+    )
+    op.create_unique_constraint(
+        'uq_spimex_trading_results_date_exchange_product_id',
+        'spimex_trading_results', ['date', 'exchange_product_id']
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint(
+        'uq_spimex_trading_results_date_exchange_product_id',
+        'spimex_trading_results', type_='unique'
+    )
@@ -0,0 +1,38 @@
+"""Ingest state
+
+Revision ID: 7b74c0042a83
+Revises: c883dca32b9e
+Create Date: 2026-10-17 10:12:41.318204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7b74c0042a83'
+down_revision: Union[str, None] = 'c883dca32b9e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('ingest_state',
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('last_date', sa.Date(), nullable=False),
+    sa.Column('updated_on', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+    op.execute(
+        "INSERT INTO ingest_state (name, last_date, updated_on) "
+        "SELECT 'spimex_trading_results', max(date), now() "
+        "FROM spimex_trading_results HAVING max(date) IS NOT NULL"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('ingest_state')
@@ -0,0 +1,104 @@
+"""Partition trading results by year
+
+Revision ID: 807dea677256
+Revises: d1171a75c7ce
+Create Date: 2026-10-17 13:38:27.905114
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '807dea677256'
+down_revision: Union[str, None] = 'd1171a75c7ce'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLE = 'spimex_trading_results'
+OLD_TABLE = 'spimex_trading_results_old'
+COLUMNS = (
+    'id, exchange_product_id, exchange_product_name, oil_id, '
+    'delivery_basis_id, delivery_basis_name, delivery_type_id, volume, '
+    'total, count, date, created_on, updated_on'
+)
+INDEXES = {
+    'ix_spimex_trading_results_date_id': 'date, id',
+    'ix_spimex_trading_results_oil_type_basis_date':
+        'oil_id, delivery_type_id, delivery_basis_id, date',
+    'ix_spimex_trading_results_basis_date': 'delivery_basis_id, date',
+}
+UNIQUE_CONSTRAINT = 'uq_spimex_trading_results_date_exchange_product_id'
+
+
+def rename_to_old() -> None:
+    op.execute(f'ALTER TABLE {TABLE} RENAME TO {OLD_TABLE}')
+    op.execute(f'ALTER TABLE {OLD_TABLE} DROP CONSTRAINT {UNIQUE_CONSTRAINT}')
+    op.execute(f'ALTER TABLE {OLD_TABLE} DROP CONSTRAINT {TABLE}_pkey')
+    for name in INDEXES:
+        op.execute(f'DROP INDEX {name}')
+
+
+def move_from_old() -> None:
+    op.execute(f'ALTER SEQUENCE {TABLE}_id_seq OWNED BY {TABLE}.id')
+    op.execute(
+        f'INSERT INTO {TABLE} ({COLUMNS}) SELECT {COLUMNS} FROM {OLD_TABLE}')
+    op.execute(f'DROP TABLE {OLD_TABLE}')
+    op.execute(
+        f'ALTER TABLE {TABLE} ADD CONSTRAINT {UNIQUE_CONSTRAINT} '
+        'UNIQUE (date, exchange_product_id)'
+    )
+    for name, columns in INDEXES.items():
+        op.execute(f'CREATE INDEX {name} ON {TABLE} ({columns})')
+    op.execute(f'ANALYZE {TABLE}')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    rename_to_old()
+    op.execute(
+        f'CREATE TABLE {TABLE} (LIKE {OLD_TABLE} INCLUDING DEFAULTS, '
+        f'CONSTRAINT {TABLE}_pkey PRIMARY KEY (id, date)) '
+        'PARTITION BY RANGE (date)'
+    )
+    op.execute(f'''
+        DO $$
+        DECLARE
+            partition_year integer;
+        BEGIN
+            FOR partition_year IN
+                SELECT generate_series(
+                    coalesce(min_year, current_year),
+                    greatest(max_year, current_year + 1)
+                )
+                FROM (
+                    SELECT
+                        min(extract(year FROM date))::integer,
+                        max(extract(year FROM date))::integer
+                    FROM {OLD_TABLE}
+                ) AS bounds(min_year, max_year),
+                (SELECT extract(year FROM current_date)::integer) AS now(current_year)
+            LOOP
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF {TABLE} FOR VALUES FROM (%L) TO (%L)',
+                    '{TABLE}_y' || partition_year,
+                    make_date(partition_year, 1, 1),
+                    make_date(partition_year + 1, 1, 1)
+                );
+            END LOOP;
+        END
+        $$
+    ''')
+    op.execute(f'CREATE TABLE {TABLE}_default PARTITION OF {TABLE} DEFAULT')
+    move_from_old()
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    rename_to_old()
+    op.execute(
+        f'CREATE TABLE {TABLE} (LIKE {OLD_TABLE} INCLUDING DEFAULTS, '
+        f'CONSTRAINT {TABLE}_pkey PRIMARY KEY (id))'
+    )
+    move_from_old()
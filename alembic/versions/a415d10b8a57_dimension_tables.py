@@ -0,0 +1,76 @@
+"""Dimension tables for products and delivery bases
+
+Revision ID: a415d10b8a57
+Revises: 807dea677256
+Create Date: 2026-10-17 15:02:41.530176
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a415d10b8a57'
+down_revision: Union[str, None] = '807dea677256'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLE = 'spimex_trading_results'
+# таблица справочника, код, наименование, ключ в таблице фактов
+DIMENSIONS = (
+    ('products', 'exchange_product_id', 'exchange_product_name', 'product_key'),
+    ('delivery_bases', 'delivery_basis_id', 'delivery_basis_name', 'delivery_basis_key'),
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('products',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('exchange_product_id', sa.String(), nullable=False),
+    sa.Column('exchange_product_name', sa.String(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('exchange_product_id', 'exchange_product_name', name='uq_products_exchange_product_id_name')
+    )
+    op.create_table('delivery_bases',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('delivery_basis_id', sa.String(length=3), nullable=False),
+    sa.Column('delivery_basis_name', sa.String(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('delivery_basis_id', 'delivery_basis_name', name='uq_delivery_bases_delivery_basis_id_name')
+    )
+
+    for dimension, code, name, key in DIMENSIONS:
+        op.execute(
+            f'INSERT INTO {dimension} ({code}, {name}) '
+            f'SELECT DISTINCT {code}, {name} FROM {TABLE} ORDER BY {code}, {name}'
+        )
+        op.add_column(TABLE, sa.Column(key, sa.Integer(), nullable=True))
+        op.execute(
+            f'UPDATE {TABLE} SET {key} = {dimension}.id FROM {dimension} '
+            f'WHERE {dimension}.{code} = {TABLE}.{code} '
+            f'AND {dimension}.{name} = {TABLE}.{name}'
+        )
+        op.alter_column(TABLE, key, nullable=False)
+        op.create_foreign_key(f'{TABLE}_{key}_fkey', TABLE, dimension, [key], ['id'])
+        op.drop_column(TABLE, name)
+
+    op.execute(f'ANALYZE {TABLE}')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for dimension, code, name, key in DIMENSIONS:
+        op.add_column(TABLE, sa.Column(name, sa.String(), nullable=True))
+        op.execute(
+            f'UPDATE {TABLE} SET {name} = {dimension}.{name} FROM {dimension} '
+            f'WHERE {dimension}.id = {TABLE}.{key}'
+        )
+        op.alter_column(TABLE, name, nullable=False)
+        op.drop_constraint(f'{TABLE}_{key}_fkey', TABLE, type_='foreignkey')
+        op.drop_column(TABLE, key)
+
+    op.drop_table('delivery_bases')
+    op.drop_table('products')
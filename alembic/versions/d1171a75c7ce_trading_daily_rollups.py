@@ -0,0 +1,47 @@
+"""Trading daily rollups
+
+Revision ID: d1171a75c7ce
+Revises: e03c6dbfe69c
+Create Date: 2026-10-17 13:05:12.418903
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd1171a75c7ce'
+down_revision: Union[str, None] = 'e03c6dbfe69c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('trading_daily_rollups',
+    sa.Column('date', sa.Date(), nullable=False),
+    sa.Column('oil_id', sa.String(length=4), nullable=False),
+    sa.Column('delivery_basis_id', sa.String(length=3), nullable=False),
+    sa.Column('delivery_type_id', sa.String(length=1), nullable=False),
+    sa.Column('row_count', sa.Integer(), nullable=False),
+    sa.Column('volume', sa.BigInteger(), nullable=False),
+    sa.Column('total', sa.BigInteger(), nullable=False),
+    sa.Column('count', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('date', 'oil_id', 'delivery_basis_id', 'delivery_type_id')
+    )
+    op.execute(
+        'INSERT INTO trading_daily_rollups '
+        '(date, oil_id, delivery_basis_id, delivery_type_id, '
+        'row_count, volume, total, count) '
+        'SELECT date, oil_id, delivery_basis_id, delivery_type_id, '
+        'count(*), sum(volume), sum(total), sum(count) '
+        'FROM spimex_trading_results '
+        'GROUP BY date, oil_id, delivery_basis_id, delivery_type_id'
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('trading_daily_rollups')
@@ -0,0 +1,45 @@
+"""Keyset date id index
+
+Revision ID: e03c6dbfe69c
+Revises: 32530490efab
+Create Date: 2026-10-17 12:41:08.317204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e03c6dbfe69c'
+down_revision: Union[str, None] = '32530490efab'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_spimex_trading_results_date_id', 'spimex_trading_results',
+            ['date', 'id'], postgresql_concurrently=True, if_not_exists=True
+        )
+        op.drop_index(
+            'ix_spimex_trading_results_date',
+            table_name='spimex_trading_results',
+            postgresql_concurrently=True, if_exists=True
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_spimex_trading_results_date', 'spimex_trading_results',
+            ['date'], postgresql_concurrently=True, if_not_exists=True
+        )
+        op.drop_index(
+            'ix_spimex_trading_results_date_id',
+            table_name='spimex_trading_results',
+            postgresql_concurrently=True, if_exists=True
+        )
@@ -0,0 +1,41 @@
+"""Trading API indexes
+
+Revision ID: ffe35cc80da6
+Revises: 326cc00190b1
+Create Date: 2026-10-17 11:48:37.902145
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'ffe35cc80da6'
+down_revision: Union[str, None] = '326cc00190b1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = {
+    'ix_spimex_trading_results_date': ['date'],
+    'ix_spimex_trading_results_oil_type_basis_date': [
+        'oil_id', 'delivery_type_id', 'delivery_basis_id', 'date'],
+    'ix_spimex_trading_results_basis_date': ['delivery_basis_id', 'date'],
+}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.get_context().autocommit_block():
+        for name, columns in INDEXES.items():
+            op.create_index(
+                name, 'spimex_trading_results', columns,
+                postgresql_concurrently=True, if_not_exists=True
+            )
+    op.execute('ANALYZE spimex_trading_results')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for name in INDEXES:
+        op.drop_index(name, table_name='spimex_trading_results')
@@ -0,0 +1,50 @@
+from sqlalchemy import Date
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import FunctionElement
+
+
+class week_start(FunctionElement):
+    """Понедельник недели, к которой относится дата."""
+
+    type = Date()
+    name = 'week_start'
+    inherit_cache = True
+
+
+class month_start(FunctionElement):
+    """Первое число месяца, к которому относится дата."""
+
+    type = Date()
+    name = 'month_start'
+    inherit_cache = True
+
+
+@compiles(week_start)
+def compile_week_start(element, compiler, **kw):
+    return f"CAST(date_trunc('week', {compiler.process(element.clauses, **kw)}) AS DATE)"
+
+
+@compiles(month_start)
+def compile_month_start(element, compiler, **kw):
+    return f"CAST(date_trunc('month', {compiler.process(element.clauses, **kw)}) AS DATE)"
+
+
+@compiles(week_start, 'sqlite')
+def compile_week_start_sqlite(element, compiler, **kw):
+    column = compiler.process(element.clauses, **kw)
+    return f"date({column}, '-' || ((CAST(strftime('%w', {column}) AS INTEGER) + 6) % 7) || ' days')"
+
+
+@compiles(month_start, 'sqlite')
+def compile_month_start_sqlite(element, compiler, **kw):
+    return f"date({compiler.process(element.clauses, **kw)}, 'start of month')"
+
+
+def date_bucket(column, bucket: str):
+    """Приводит дату к началу дня, недели или месяца."""
+
+    if bucket == 'week':
+        return week_start(column)
+    if bucket == 'month':
+        return month_start(column)
+    return column
@@ -3,13 +3,17 @@ from contextlib import asynccontextmanager
 from fastapi import FastAPI
 
 from api.cache import setup_redis_cache
+from api.metrics import MetricsMiddleware, instrument_engine
+from api.metrics import router as metrics_router
 from api.routers import router
+from core.database import engine
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    await setup_redis_cache(app)
+    listener = await setup_redis_cache(app)
     yield
+    listener.cancel()
 
 app = FastAPI(
     title='Spimex Trading API',
@@ -18,4 +22,8 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+app.add_middleware(MetricsMiddleware)
 app.include_router(router)
+app.include_router(metrics_router)
+
+instrument_engine(engine)
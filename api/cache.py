@@ -1,10 +1,31 @@
 import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from datetime import date
+from functools import wraps
+from inspect import signature
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
 
-import aioredis
-from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from apscheduler.triggers.cron import CronTrigger
+from fastapi import params
 from fastapi_cache import FastAPICache
+from fastapi_cache.backends import Backend
 from fastapi_cache.backends.redis import RedisBackend
+from fastapi_cache.decorator import cache as fastapi_cache
+from redis import asyncio as aioredis
+
+from api.metrics import CACHE_STATUS_HEADER, record_cache_lookup, record_cache_write, timed_handler
+from core.config import settings
+from core.events import INGESTED_DATES_CHANNEL, PENDING_DATES_KEY
+
+CACHE_PREFIX = 'spimex-cache'
+PERIOD_INDEX_KEY = f'{CACHE_PREFIX}-index:periods'
+LATEST_INDEX_KEY = f'{CACHE_PREFIX}-index:latest'
+LISTENER_RETRY_DELAY = 5
+
+logger = logging.getLogger(__name__)
 
 
 def custom_key_builder(
@@ -12,19 +33,283 @@ def custom_key_builder(
     return f'{namespace}:{request.url.path}?{request.url.query}'
 
 
-async def setup_redis_cache(app):
+class LocalCache:
+    """Ограниченный по числу записей LRU-кэш в памяти процесса со сроком жизни."""
+
+    def __init__(self, max_entries: int, ttl: int) -> None:
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries: OrderedDict[str, Tuple[float, bytes]] = OrderedDict()
+
+    def get(self, key: str) -> Optional[Tuple[int, bytes]]:
+        """Возвращает оставшийся срок жизни и значение или None."""
+
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+
+        expires_at, value = entry
+        remaining = expires_at - time.monotonic()
+        if remaining <= 0:
+            del self.entries[key]
+            return None
+
+        self.entries.move_to_end(key)
+        return int(remaining), value
+
+    def set(self, key: str, value: bytes, ttl: Optional[int] = None) -> None:
+        """Сохраняет значение не дольше ttl секунд и вытесняет старые записи."""
+
+        ttl = self.ttl if ttl is None or ttl < 0 else min(ttl, self.ttl)
+        self.entries[key] = (time.monotonic() + ttl, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def delete(self, keys: Iterable[str]) -> None:
+        for key in keys:
+            self.entries.pop(key, None)
+
+    def clear(self) -> int:
+        count = len(self.entries)
+        self.entries.clear()
+        return count
+
+
+class TieredBackend(Backend):
+    """Бэкенд fastapi_cache с локальным кэшем процесса перед Redis.
+
+    Ответ сначала ищется в LocalCache, затем в Redis; найденный в Redis
+    ответ копируется в локальный кэш. Попадания и промахи считаются
+    отдельно для каждого уровня, а итог чтения и его время попадают в
+    метрики API.
+    """
+
+    def __init__(self, local: LocalCache, remote: Backend) -> None:
+        self.local = local
+        self.remote = remote
+        self.stats: Dict[str, int] = {
+            'local_hits': 0, 'local_misses': 0,
+            'remote_hits': 0, 'remote_misses': 0,
+        }
+
+    async def get_with_ttl(self, key: str) -> Tuple[int, Optional[bytes]]:
+        started = time.perf_counter()
+        cached = self.local.get(key)
+        if cached is not None:
+            self.stats['local_hits'] += 1
+            record_cache_lookup('local-hit', time.perf_counter() - started)
+            return cached
+        self.stats['local_misses'] += 1
+
+        ttl, value = await self.remote.get_with_ttl(key)
+        if value is None:
+            self.stats['remote_misses'] += 1
+            record_cache_lookup('miss', time.perf_counter() - started)
+            return ttl, None
+
+        self.stats['remote_hits'] += 1
+        self.local.set(key, value, ttl)
+        record_cache_lookup('remote-hit', time.perf_counter() - started)
+        return ttl, value
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return (await self.get_with_ttl(key))[1]
+
+    async def set(self, key: str, value: bytes, expire: Optional[int] = None) -> None:
+        started = time.perf_counter()
+        self.local.set(key, value, expire)
+        await self.remote.set(key, value, expire)
+        record_cache_write(time.perf_counter() - started)
+
+    async def clear(self, namespace: Optional[str] = None, key: Optional[str] = None) -> int:
+        if namespace:
+            self.local.delete([k for k in self.local.entries if k.startswith(f'{namespace}:')])
+        elif key:
+            self.local.delete([key])
+        return await self.remote.clear(namespace, key)
+
+
+def coalesce(func):
+    """Объединяет одновременные вызовы обработчика с одинаковыми параметрами.
+
+    Пока первый вызов выполняется, остальные ждут его результат, поэтому
+    одновременные промахи кэша по одному ключу дают один запрос к базе.
+    Зависимости (Depends) в ключ не входят.
+    """
+
+    dependencies = {
+        name for name, parameter in signature(func).parameters.items()
+        if isinstance(parameter.default, params.Depends)
+    }
+    in_flight: Dict[str, asyncio.Future] = {}
+
+    @wraps(func)
+    async def inner(*args, **kwargs):
+        key = repr((args, sorted(
+            (name, value) for name, value in kwargs.items() if name not in dependencies)))
+        task = in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(func(*args, **kwargs))
+            in_flight[key] = task
+            task.add_done_callback(lambda _: in_flight.pop(key, None))
+        return await asyncio.shield(task)
+
+    return inner
+
+
+def cache(expire: Optional[int] = None):
+    """Декоратор fastapi_cache.cache с объединением одновременных промахов.
+
+    Время ожидания результата обработчика учитывается в метриках запроса.
+    """
+
+    def wrapper(func):
+        cached = fastapi_cache(expire=expire)(timed_handler(coalesce(func)))
+        cached.__wrapped__ = func
+        return cached
+
+    return wrapper
+
+
+def cached_period(key: str) -> Optional[Tuple[date, date]]:
+    """Период (start_date, end_date) закэшированного ответа или None."""
+
+    query = parse_qs(urlsplit(key[key.find('/'):]).query)
+    try:
+        return (
+            date.fromisoformat(query['start_date'][0]),
+            date.fromisoformat(query['end_date'][0]),
+        )
+    except (KeyError, ValueError):
+        return None
+
+
+def is_key_affected(key: str, dates: Iterable[date]) -> bool:
+    """Проверяет, устарел ли закэшированный ответ после загрузки дат.
+
+    Ответы за закрытый период (start_date, end_date) устаревают только при
+    записи даты внутри периода, остальные ответы зависят от последних торгов
+    и устаревают при любой загрузке.
+    """
+
+    period = cached_period(key)
+    if period is None:
+        return True
+
+    start_date, end_date = period
+    return any(start_date <= trading_date <= end_date for trading_date in dates)
+
+
+def index_cache_key(pipe, key: str) -> None:
+    """Добавляет ключ ответа в индекс для инвалидации по датам.
+
+    Ответы за период попадают в сортированное множество PERIOD_INDEX_KEY с
+    конечной датой периода в качестве веса, остальные - в LATEST_INDEX_KEY.
+    """
+
+    period = cached_period(key)
+    if period is None:
+        pipe.sadd(LATEST_INDEX_KEY, key)
+    else:
+        pipe.zadd(PERIOD_INDEX_KEY, {key: period[1].toordinal()})
+
+
+class IndexedRedisBackend(RedisBackend):
+    """RedisBackend, записывающий вместе с ответом его ключ в индекс.
+
+    Ответ и запись индекса сохраняются одной транзакцией, поэтому
+    инвалидация по индексу не пропускает закэшированные ответы.
+    """
+
+    async def set(self, key: str, value: bytes, expire: Optional[int] = None) -> None:
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.set(key, value, ex=expire)
+            index_cache_key(pipe, key)
+            await pipe.execute()
+
+
+async def index_cached_keys(redis) -> None:
+    """Добавляет в индекс ответы, закэшированные до его появления."""
+
+    async with redis.pipeline(transaction=False) as pipe:
+        async for key in redis.scan_iter(match=f'{CACHE_PREFIX}:*'):
+            index_cache_key(pipe, key.decode())
+        await pipe.execute()
+
+
+async def evict_cached_dates(
+    redis, dates: List[date], local: Optional[LocalCache] = None
+) -> int:
+    """Удаляет из Redis и локального кэша ответы, затронутые загрузкой дат.
+
+    Ключи берутся из индекса: ответы за периоды, заканчивающиеся не раньше
+    первой загруженной даты, и ответы без периода. Ключи удаляются вместе с
+    записями индекса одной транзакцией.
+    """
+
+    if local is not None:
+        local.delete([key for key in local.entries if is_key_affected(key, dates)])
+
+    first_date = min(dates, default=date.max)
+    candidates = await redis.zrangebyscore(PERIOD_INDEX_KEY, first_date.toordinal(), '+inf')
+    keys = [key for key in candidates if is_key_affected(key.decode(), dates)]
+    keys.extend(await redis.smembers(LATEST_INDEX_KEY))
+    if keys:
+        async with redis.pipeline(transaction=True) as pipe:
+            pipe.delete(*keys)
+            pipe.zrem(PERIOD_INDEX_KEY, *keys)
+            pipe.srem(LATEST_INDEX_KEY, *keys)
+            await pipe.execute()
+    return len(keys)
+
+
+async def listen_ingested_dates(redis, local: Optional[LocalCache] = None) -> None:
+    """Инвалидирует кэш по сообщениям парсера о загруженных датах.
+
+    При обрыве соединения с Redis подписка восстанавливается, а даты,
+    опубликованные без подписчиков, забираются из PENDING_DATES_KEY.
+    """
+
+    while True:
+        try:
+            async with redis.pubsub() as pubsub:
+                await pubsub.subscribe(INGESTED_DATES_CHANNEL)
+
+                pending = await redis.smembers(PENDING_DATES_KEY)
+                if pending:
+                    await evict_cached_dates(redis, [
+                        date.fromisoformat(value.decode()) for value in pending], local)
+                    await redis.srem(PENDING_DATES_KEY, *pending)
+
+                async for message in pubsub.listen():
+                    if message['type'] != 'message':
+                        continue
+                    await evict_cached_dates(redis, [
+                        date.fromisoformat(value)
+                        for value in json.loads(message['data'])
+                    ], local)
+
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f'Ошибка подписки на загруженные даты: {e}')
+            await asyncio.sleep(LISTENER_RETRY_DELAY)
+
 
-    def task():
-        asyncio.run_coroutine_threadsafe(redis.flushdb(), loop)
+async def setup_redis_cache(app) -> asyncio.Task:
 
-    redis = aioredis.from_url('redis://localhost:6379')
+    redis = aioredis.from_url(settings.REDIS_URL)
+    local = LocalCache(settings.CACHE_LOCAL_MAX_ENTRIES, settings.CACHE_LOCAL_TTL)
+    try:
+        await index_cached_keys(redis)
+    except Exception as e:
+        logger.warning(f'Не удалось проиндексировать закэшированные ответы: {e}')
     FastAPICache.init(
-        RedisBackend(redis),
-        prefix='spimex-cache',
-        key_builder=custom_key_builder
+        TieredBackend(local, IndexedRedisBackend(redis)),
+        prefix=CACHE_PREFIX,
+        key_builder=custom_key_builder,
+        cache_status_header=CACHE_STATUS_HEADER,
     )
 
-    scheduler = AsyncIOScheduler()
-    loop = asyncio.get_event_loop()
-    scheduler.add_job(task, CronTrigger(hour=14, minute=11))
-    scheduler.start()
+    return asyncio.create_task(listen_ingested_dates(redis, local))
@@ -4,3 +4,7 @@ from core.database import async_session
 async def get_async_session():
     async with async_session() as session:
         yield session
+
+
+def get_session_fabric():
+    return async_session
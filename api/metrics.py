@@ -0,0 +1,198 @@
+import time
+from contextvars import ContextVar
+from functools import wraps
+from typing import Optional
+
+from fastapi import APIRouter
+from fastapi.responses import Response
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Histogram, generate_latest
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from starlette.datastructures import MutableHeaders
+
+from core.metrics import DEFAULT_BUCKETS, registry
+
+METRICS_PATH = '/metrics'
+CACHE_STATUS_HEADER = 'X-FastAPI-Cache'
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+UNMATCHED_ROUTE = 'unmatched'
+
+API_REQUEST_SECONDS = Histogram(
+    'spimex_api_request_seconds', 'Длительность обработки запросов API до конца тела ответа',
+    ['method', 'route', 'status'], buckets=DEFAULT_BUCKETS, registry=registry)
+API_RESPONSE_BYTES = Histogram(
+    'spimex_api_response_bytes', 'Размер тел ответов API',
+    ['route'], buckets=SIZE_BUCKETS, registry=registry)
+API_DB_QUERIES = Counter(
+    'spimex_api_db_queries', 'Число SQL-запросов, выполненных при обработке запросов API',
+    ['route'], registry=registry)
+API_DB_SECONDS = Histogram(
+    'spimex_api_db_seconds', 'Суммарное время SQL-запросов на один запрос API',
+    ['route'], buckets=DEFAULT_BUCKETS, registry=registry)
+API_CACHE_RESPONSES = Counter(
+    'spimex_api_cache_responses', 'Ответы кэшируемых обработчиков по статусу fastapi_cache',
+    ['route', 'status'], registry=registry)
+API_CACHE_LOOKUPS = Counter(
+    'spimex_api_cache_lookups', 'Чтения из кэша ответов по уровню, на котором найден ответ',
+    ['result'], registry=registry)
+
+router = APIRouter(tags=['Metrics'])
+
+
+class RequestTimings:
+    """Время, затраченное запросом API на кэш, базу и обработчик."""
+
+    __slots__ = ('cache_result', 'cache_seconds', 'db_queries', 'db_seconds', 'handler_seconds')
+
+    def __init__(self) -> None:
+        self.cache_result: Optional[str] = None
+        self.cache_seconds = 0.0
+        self.db_queries = 0
+        self.db_seconds = 0.0
+        self.handler_seconds = 0.0
+
+    def server_timing(self, total: float, cache_status: Optional[str] = None) -> str:
+        """Значение заголовка Server-Timing, длительности в миллисекундах.
+
+        orm - время обработчика без SQL (построение объектов и запросов),
+        render - остаток до отправки заголовков: зависимости, кодирование
+        ответа в кэш и сериализация JSON.
+        """
+
+        entries = []
+        cache_result = self.cache_result or (cache_status and cache_status.lower())
+        if cache_result:
+            entries.append(f'cache;desc="{cache_result}";dur={self.cache_seconds * 1000:.2f}')
+        if self.db_queries:
+            entries.append(f'db;desc="queries: {self.db_queries}";dur={self.db_seconds * 1000:.2f}')
+        if self.handler_seconds:
+            orm = max(self.handler_seconds - self.db_seconds, 0)
+            entries.append(f'orm;dur={orm * 1000:.2f}')
+        render = max(total - self.cache_seconds - self.handler_seconds, 0)
+        entries.append(f'render;dur={render * 1000:.2f}')
+        entries.append(f'total;dur={total * 1000:.2f}')
+        return ', '.join(entries)
+
+
+_request_timings: ContextVar[Optional[RequestTimings]] = ContextVar(
+    'request_timings', default=None)
+
+
+def current_timings() -> Optional[RequestTimings]:
+    """Счетчики текущего запроса API или None вне запроса."""
+
+    return _request_timings.get()
+
+
+def record_cache_lookup(result: str, seconds: float) -> None:
+    """Учитывает чтение из кэша ответов: local-hit, remote-hit или miss."""
+
+    API_CACHE_LOOKUPS.labels(result=result).inc()
+    timings = current_timings()
+    if timings is not None:
+        timings.cache_result = result
+        timings.cache_seconds += seconds
+
+
+def record_cache_write(seconds: float) -> None:
+    timings = current_timings()
+    if timings is not None:
+        timings.cache_seconds += seconds
+
+
+def timed_handler(func):
+    """Учитывает время выполнения обработчика в текущем запросе."""
+
+    @wraps(func)
+    async def inner(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            timings = current_timings()
+            if timings is not None:
+                timings.handler_seconds += time.perf_counter() - started
+
+    return inner
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # время начала хранится в контексте выполнения, а не в conn.info:
+    # для упавшего запроса after_cursor_execute не вызывается, и контекст
+    # отбрасывается вместе с ним
+    context.query_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context.query_started
+    timings = current_timings()
+    if timings is not None:
+        timings.db_queries += 1
+        timings.db_seconds += elapsed
+
+
+def instrument_engine(engine: AsyncEngine) -> None:
+    """Подключает учет SQL-запросов движка к счетчикам запросов API."""
+
+    sync_engine = engine.sync_engine
+    if not event.contains(sync_engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(sync_engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(sync_engine, 'after_cursor_execute', _after_cursor_execute)
+
+
+def route_path(scope) -> str:
+    """Шаблон пути маршрута, чтобы метки не зависели от параметров запроса."""
+
+    return getattr(scope.get('route'), 'path', UNMATCHED_ROUTE)
+
+
+class MetricsMiddleware:
+    """ASGI-middleware с метриками запросов API и заголовком Server-Timing.
+
+    Заголовок собирается в момент отправки заголовков ответа, поэтому для
+    потоковых выгрузок в него не попадают запросы, выполненные при отдаче
+    тела; в метриках они учитываются вместе с полным временем ответа.
+    """
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope['type'] != 'http' or scope['path'] == METRICS_PATH:
+            await self.app(scope, receive, send)
+            return
+
+        timings = RequestTimings()
+        token = _request_timings.set(timings)
+        started = time.perf_counter()
+        status, size, cache_status = 500, 0, None
+
+        async def send_with_metrics(message) -> None:
+            nonlocal status, size, cache_status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+                headers = MutableHeaders(scope=message)
+                cache_status = headers.get(CACHE_STATUS_HEADER)
+                headers.append('Server-Timing', timings.server_timing(
+                    time.perf_counter() - started, cache_status))
+            elif message['type'] == 'http.response.body':
+                size += len(message.get('body', b''))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_metrics)
+        finally:
+            _request_timings.reset(token)
+            route = route_path(scope)
+            API_REQUEST_SECONDS.labels(method=scope['method'], route=route, status=status).observe(
+                time.perf_counter() - started)
+            API_RESPONSE_BYTES.labels(route=route).observe(size)
+            API_DB_QUERIES.labels(route=route).inc(timings.db_queries)
+            API_DB_SECONDS.labels(route=route).observe(timings.db_seconds)
+            if cache_status:
+                API_CACHE_RESPONSES.labels(route=route, status=cache_status.lower()).inc()
+
+
+@router.get(METRICS_PATH, include_in_schema=False)
+async def metrics():
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,23 @@
+import base64
+from datetime import date
+from typing import Tuple
+
+from fastapi import HTTPException
+
+
+def encode_cursor(trading_date: date, row_id: int) -> str:
+    """Кодирует позицию последней выданной записи (дата, id) в курсор."""
+
+    raw = f'{trading_date.isoformat()}:{row_id}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[date, int]:
+    """Восстанавливает позицию (дата, id) из курсора."""
+
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        trading_date, row_id = raw.decode().split(':')
+        return date.fromisoformat(trading_date), int(row_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail='Некорректный курсор')
@@ -1,14 +1,50 @@
+import csv
+import io
+import json
 from datetime import date
-from typing import Optional
+from typing import AsyncIterator, Literal, Optional, Sequence
 
+import pyarrow as pa
+import pyarrow.parquet as pq
 from fastapi import APIRouter, Depends, Query
-from fastapi_cache.decorator import cache
-from sqlalchemy import desc, func, select
-from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi.responses import StreamingResponse
+from sqlalchemy import Float, Row, cast, desc, func, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
-from api.dependencies import get_async_session
-from api.schemas import SpimexTradingResultOut
-from core.models import SpimexTradingResult
+from api.aggregation import date_bucket
+from api.cache import cache
+from api.dependencies import get_async_session, get_session_fabric
+from api.pagination import decode_cursor, encode_cursor
+from api.schemas import SpimexTradingAggregateOut, SpimexTradingResultOut, SpimexTradingResultPage
+from core.models import DeliveryBasis, Product, SpimexTradingResult, TradingDailyRollup, TradingDay
+
+EXPORT_COLUMNS = list(SpimexTradingResultOut.model_fields)
+DIMENSION_COLUMNS = {
+    'exchange_product_name': Product.exchange_product_name,
+    'delivery_basis_name': DeliveryBasis.delivery_basis_name,
+}
+EXPORT_BATCH_SIZE = 5000
+EXPORT_MEDIA_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv; charset=utf-8',
+}
+ARROW_SCHEMA = pa.schema([
+    ('exchange_product_id', pa.string()),
+    ('exchange_product_name', pa.string()),
+    ('oil_id', pa.string()),
+    ('delivery_basis_id', pa.string()),
+    ('delivery_basis_name', pa.string()),
+    ('delivery_type_id', pa.string()),
+    ('volume', pa.int64()),
+    ('total', pa.int64()),
+    ('count', pa.int64()),
+    ('date', pa.date32()),
+])
+GROUP_BY_COLUMNS = Literal['oil_id', 'delivery_type_id', 'delivery_basis_id']
+COLUMNAR_FORMATS = {
+    'arrow': ('application/vnd.apache.arrow.stream', 'arrows'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
 
 router = APIRouter(prefix='/trading', tags=['Trading Results'])
 
@@ -22,12 +58,7 @@ async def last_trading_dates(
     limit: int = Query(10, ge=1),
     session: AsyncSession = Depends(get_async_session),
 ):
-    result = await session.execute(
-        select(SpimexTradingResult.date)
-        .distinct()
-        .order_by(desc(SpimexTradingResult.date))
-        .limit(limit)
-    )
+    result = await session.execute(last_dates_query(limit))
     result = [row[0] for row in result.fetchall()]
     return result
 
@@ -47,16 +78,124 @@ async def get_dynamics(
     session: AsyncSession = Depends(get_async_session),
 ):
 
-    stmt = select(SpimexTradingResult).where(
-        SpimexTradingResult.date.between(start_date, end_date)
+    stmt = dynamics_query(
+        start_date, end_date, oil_id, delivery_type_id, delivery_basis_id)
+
+    result = await session.execute(stmt)
+
+    return [SpimexTradingResultOut.model_validate(row) for row in result.scalars()]
+
+
+@router.get(
+    '/dynamics/page',
+    response_model=SpimexTradingResultPage,
+    summary='Получить страницу торгов за заданный период'
+)
+@cache()
+async def get_dynamics_page(
+    start_date: date,
+    end_date: date,
+    oil_id: Optional[str] = None,
+    delivery_type_id: Optional[str] = None,
+    delivery_basis_id: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(1000, ge=1, le=10000),
+    session: AsyncSession = Depends(get_async_session),
+):
+
+    stmt = dynamics_page_query(
+        start_date, end_date, oil_id, delivery_type_id, delivery_basis_id,
+        cursor, limit)
+
+    result = await session.execute(stmt)
+    rows = result.scalars().all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].date, rows[-1].id)
+
+    return SpimexTradingResultPage(
+        items=[SpimexTradingResultOut.model_validate(row) for row in rows],
+        next_cursor=next_cursor,
     )
 
-    stmt = apply_filters(stmt, oil_id, delivery_type_id, delivery_basis_id)
-    stmt = stmt.order_by(SpimexTradingResult.date.desc())
+
+@router.get(
+    '/dynamics/aggregates',
+    response_model=list[SpimexTradingAggregateOut],
+    summary='Получить итоги торгов за заданный период по дням, неделям или месяцам'
+)
+@cache()
+async def get_dynamics_aggregates(
+    start_date: date,
+    end_date: date,
+    oil_id: Optional[str] = None,
+    delivery_type_id: Optional[str] = None,
+    delivery_basis_id: Optional[str] = None,
+    group_by: list[GROUP_BY_COLUMNS] = Query([]),
+    bucket: Literal['day', 'week', 'month'] = 'day',
+    session: AsyncSession = Depends(get_async_session),
+):
+
+    stmt = aggregates_query(
+        start_date, end_date, oil_id, delivery_type_id, delivery_basis_id,
+        group_by, bucket)
 
     result = await session.execute(stmt)
 
-    return result.scalars().all()
+    return [SpimexTradingAggregateOut(**row._asdict()) for row in result]
+
+
+@router.get(
+    '/dynamics/export',
+    summary='Выгрузить торги за заданный период в NDJSON или CSV'
+)
+async def export_dynamics(
+    start_date: date,
+    end_date: date,
+    oil_id: Optional[str] = None,
+    delivery_type_id: Optional[str] = None,
+    delivery_basis_id: Optional[str] = None,
+    format: Literal['ndjson', 'csv'] = 'ndjson',
+    session_fabric: async_sessionmaker = Depends(get_session_fabric),
+):
+
+    stmt = dynamics_query(
+        start_date, end_date, oil_id, delivery_type_id, delivery_basis_id)
+
+    return StreamingResponse(
+        stream_rows(session_fabric, stmt, format),
+        media_type=EXPORT_MEDIA_TYPES[format],
+    )
+
+
+@router.get(
+    '/dynamics/columnar',
+    summary='Выгрузить торги за заданный период в Arrow IPC или Parquet'
+)
+async def export_dynamics_columnar(
+    start_date: date,
+    end_date: date,
+    oil_id: Optional[str] = None,
+    delivery_type_id: Optional[str] = None,
+    delivery_basis_id: Optional[str] = None,
+    format: Literal['arrow', 'parquet'] = 'arrow',
+    session_fabric: async_sessionmaker = Depends(get_session_fabric),
+):
+
+    stmt = dynamics_query(
+        start_date, end_date, oil_id, delivery_type_id, delivery_basis_id)
+
+    media_type, extension = COLUMNAR_FORMATS[format]
+    return StreamingResponse(
+        stream_record_batches(session_fabric, stmt, format),
+        media_type=media_type,
+        headers={
+            'Content-Disposition':
+                f'attachment; filename="dynamics.{extension}"'
+        },
+    )
 
 
 @router.get(
@@ -72,34 +211,235 @@ async def get_trading_results(
     session: AsyncSession = Depends(get_async_session),
 ):
 
-    subquery = (
-        select(func.max(SpimexTradingResult.date).label('max_date'))
-        .scalar_subquery()
-    )
-
-    stmt = select(SpimexTradingResult).where(
-        SpimexTradingResult.date == subquery
-    )
-    stmt = apply_filters(stmt, oil_id, delivery_type_id, delivery_basis_id)
+    stmt = latest_results_query(oil_id, delivery_type_id, delivery_basis_id)
 
     result = await session.execute(stmt)
 
-    return result.scalars().all()
+    return [SpimexTradingResultOut.model_validate(row) for row in result.scalars()]
 
 
 def apply_filters(
     stmt,
     oil_id: Optional[str] = None,
     delivery_type_id: Optional[str] = None,
-    delivery_basis_id: Optional[str] = None
+    delivery_basis_id: Optional[str] = None,
+    model=SpimexTradingResult
 ):
 
     if oil_id:
-        stmt = stmt.where(SpimexTradingResult.oil_id == oil_id)
+        stmt = stmt.where(model.oil_id == oil_id)
     if delivery_type_id:
-        stmt = stmt.where(
-            SpimexTradingResult.delivery_type_id == delivery_type_id)
+        stmt = stmt.where(model.delivery_type_id == delivery_type_id)
     if delivery_basis_id:
-        stmt = stmt.where(
-            SpimexTradingResult.delivery_basis_id == delivery_basis_id)
+        stmt = stmt.where(model.delivery_basis_id == delivery_basis_id)
     return stmt
+
+
+def last_dates_query(limit: int):
+    return (
+        select(TradingDay.date)
+        .order_by(desc(TradingDay.date))
+        .limit(limit)
+    )
+
+
+def dynamics_query(
+    start_date: date,
+    end_date: date,
+    oil_id: Optional[str] = None,
+    delivery_type_id: Optional[str] = None,
+    delivery_basis_id: Optional[str] = None
+):
+
+    stmt = select(SpimexTradingResult).where(
+        SpimexTradingResult.date.between(start_date, end_date)
+    )
+
+    stmt = apply_filters(stmt, oil_id, delivery_type_id, delivery_basis_id)
+    return stmt.order_by(
+        SpimexTradingResult.date.desc(), SpimexTradingResult.id.desc())
+
+
+def dynamics_page_query(
+    start_date: date,
+    end_date: date,
+    oil_id: Optional[str] = None,
+    delivery_type_id: Optional[str] = None,
+    delivery_basis_id: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = 1000
+):
+
+    stmt = dynamics_query(
+        start_date, end_date, oil_id, delivery_type_id, delivery_basis_id)
+
+    if cursor:
+        cursor_date, cursor_id = decode_cursor(cursor)
+        stmt = stmt.where(
+            tuple_(SpimexTradingResult.date, SpimexTradingResult.id)
+            < tuple_(cursor_date, cursor_id)
+        )
+    return stmt.limit(limit + 1)
+
+
+def aggregates_query(
+    start_date: date,
+    end_date: date,
+    oil_id: Optional[str] = None,
+    delivery_type_id: Optional[str] = None,
+    delivery_basis_id: Optional[str] = None,
+    group_by: Sequence[str] = (),
+    bucket: str = 'day'
+):
+
+    period = date_bucket(TradingDailyRollup.date, bucket).label('date')
+    dimensions = [
+        getattr(TradingDailyRollup, column) for column in dict.fromkeys(group_by)
+    ]
+    volume = func.sum(TradingDailyRollup.volume)
+    total = func.sum(TradingDailyRollup.total)
+
+    stmt = select(
+        period,
+        *dimensions,
+        volume.label('volume'),
+        total.label('total'),
+        func.sum(TradingDailyRollup.count).label('count'),
+        (cast(total, Float) / func.nullif(volume, 0)).label('avg_price'),
+    ).where(
+        TradingDailyRollup.date.between(start_date, end_date)
+    )
+
+    stmt = apply_filters(
+        stmt, oil_id, delivery_type_id, delivery_basis_id, model=TradingDailyRollup)
+    return stmt.group_by(period, *dimensions).order_by(period.desc(), *dimensions)
+
+
+async def export_partitions(
+    session_fabric: async_sessionmaker, stmt
+) -> AsyncIterator[Sequence[Row]]:
+    """Читает результат запроса серверным курсором пачками строк.
+
+    Вместо объектов ORM выбираются только столбцы EXPORT_COLUMNS, наименования
+    берутся соединением со справочниками. В памяти одновременно находится не
+    больше EXPORT_BATCH_SIZE строк.
+    """
+
+    stmt = stmt.with_only_columns(*(
+        DIMENSION_COLUMNS.get(column, getattr(SpimexTradingResult, column))
+        for column in EXPORT_COLUMNS
+    )).join_from(SpimexTradingResult, Product).join_from(
+        SpimexTradingResult, DeliveryBasis
+    ).execution_options(yield_per=EXPORT_BATCH_SIZE)
+
+    async with session_fabric() as session:
+        result = await session.stream(stmt)
+        async for rows in result.partitions():
+            yield rows
+
+
+async def stream_rows(
+    session_fabric: async_sessionmaker, stmt, format: str
+) -> AsyncIterator[str]:
+    """Построчно выгружает результат запроса в NDJSON или CSV."""
+
+    if format == 'csv':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(EXPORT_COLUMNS)
+        async for rows in export_partitions(session_fabric, stmt):
+            writer.writerows(rows)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()
+    else:
+        async for rows in export_partitions(session_fabric, stmt):
+            yield ''.join(
+                json.dumps(row._asdict(), ensure_ascii=False, default=str) + '\n'
+                for row in rows
+            )
+
+
+class ChunkSink:
+    """Файловый объект для pyarrow, отдающий записанные байты порциями."""
+
+    closed = False
+
+    def __init__(self) -> None:
+        self.chunks: list[bytes] = []
+        self.position = 0
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def rows_to_record_batch(rows: Sequence[Row]) -> pa.RecordBatch:
+    """Собирает пачку строк запроса в RecordBatch по столбцам."""
+
+    columns = list(zip(*rows)) or [()] * len(ARROW_SCHEMA)
+    return pa.RecordBatch.from_arrays(
+        [
+            pa.array(values, type=field.type)
+            for values, field in zip(columns, ARROW_SCHEMA)
+        ],
+        schema=ARROW_SCHEMA,
+    )
+
+
+async def stream_record_batches(
+    session_fabric: async_sessionmaker, stmt, format: str
+) -> AsyncIterator[bytes]:
+    """Выгружает результат запроса потоком Arrow IPC или файлом Parquet.
+
+    Каждая пачка строк становится RecordBatch (для Parquet - группой
+    строк) и сразу отдается клиенту.
+    """
+
+    sink = ChunkSink()
+    if format == 'parquet':
+        writer = pq.ParquetWriter(sink, ARROW_SCHEMA)
+    else:
+        writer = pa.ipc.new_stream(sink, ARROW_SCHEMA)
+
+    try:
+        async for rows in export_partitions(session_fabric, stmt):
+            writer.write_batch(rows_to_record_batch(rows))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def latest_results_query(
+    oil_id: Optional[str] = None,
+    delivery_type_id: Optional[str] = None,
+    delivery_basis_id: Optional[str] = None
+):
+
+    subquery = (
+        select(func.max(TradingDay.date).label('max_date'))
+        .scalar_subquery()
+    )
+
+    stmt = select(SpimexTradingResult).where(
+        SpimexTradingResult.date == subquery
+    )
+    return apply_filters(stmt, oil_id, delivery_type_id, delivery_basis_id)
@@ -20,3 +20,21 @@ class SpimexTradingResultOut(BaseModel):
     model_config = {
         'from_attributes': True
     }
+
+
+class SpimexTradingResultPage(BaseModel):
+
+    items: list[SpimexTradingResultOut]
+    next_cursor: Optional[str] = None
+
+
+class SpimexTradingAggregateOut(BaseModel):
+
+    date: date
+    oil_id: Optional[str] = None
+    delivery_type_id: Optional[str] = None
+    delivery_basis_id: Optional[str] = None
+    volume: int
+    total: int
+    count: int
+    avg_price: Optional[float] = None
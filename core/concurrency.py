@@ -0,0 +1,118 @@
+import asyncio
+import time
+from contextvars import ContextVar
+from typing import Optional, Tuple
+
+from core.metrics import set_queue_depth
+
+
+class _Slot:
+    __slots__ = ('started', 'overloaded')
+
+    def __init__(self) -> None:
+        self.started = time.monotonic()
+        self.overloaded = False
+
+
+_active_slots: ContextVar[Tuple[_Slot, ...]] = ContextVar(
+    'active_slots', default=())
+
+
+def report_overload() -> None:
+    """Отмечает перегрузку для всех лимитеров, занятых текущей задачей.
+
+    Вызывается там, где видна причина (ответ 429/5xx, таймаут, ошибка
+    записи), даже если сама ошибка дальше не пробрасывается.
+    """
+
+    for slot in _active_slots.get():
+        slot.overloaded = True
+
+
+class AdaptiveLimiter:
+    """Ограничитель параллелизма с адаптивным лимитом (AIMD).
+
+    Используется как семафор: async with limiter. Пока задержка операций
+    не превышает базовую более чем в latency_tolerance раз, лимит растет
+    примерно на единицу за каждые limit завершенных операций. При
+    перегрузке (исключение, report_overload или медленная операция) лимит
+    умножается на backoff, но не чаще одного раза на поколение операций,
+    начатых после предыдущего снижения. Длина очереди ожидающих операций
+    именованного лимитера попадает в метрики процесса.
+    """
+
+    def __init__(
+        self, initial_limit: int, min_limit: int = 1,
+        max_limit: Optional[int] = None, backoff: float = 0.5,
+        latency_tolerance: float = 2.0, smoothing: float = 0.1,
+        name: Optional[str] = None
+    ) -> None:
+        self.name = name
+        self.min_limit = min_limit
+        self.max_limit = max_limit or initial_limit
+        self.backoff = backoff
+        self.latency_tolerance = latency_tolerance
+        self.smoothing = smoothing
+        self.baseline: Optional[float] = None
+        self.in_flight = 0
+        self.queue_depth = 0
+        self._limit = float(min(max(initial_limit, min_limit), self.max_limit))
+        self._last_decrease = 0.0
+        self._condition = asyncio.Condition()
+        self._slot: ContextVar[_Slot] = ContextVar(f'adaptive_limiter_{id(self)}')
+
+    @property
+    def limit(self) -> int:
+        """Текущее число одновременно разрешенных операций."""
+
+        return int(self._limit)
+
+    async def __aenter__(self) -> 'AdaptiveLimiter':
+        async with self._condition:
+            self.queue_depth += 1
+            self._report_queue_depth()
+            try:
+                await self._condition.wait_for(
+                    lambda: self.in_flight < self.limit)
+            finally:
+                self.queue_depth -= 1
+                self._report_queue_depth()
+            self.in_flight += 1
+
+        slot = _Slot()
+        self._slot.set(slot)
+        _active_slots.set(_active_slots.get() + (slot,))
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        slot = self._slot.get()
+        _active_slots.set(tuple(s for s in _active_slots.get() if s is not slot))
+
+        failed = exc_type is not None and issubclass(exc_type, Exception)
+        self._adjust(slot, time.monotonic() - slot.started, failed or slot.overloaded)
+
+        async with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    def _report_queue_depth(self) -> None:
+        if self.name is not None:
+            set_queue_depth(self.name, self.queue_depth)
+
+    def _adjust(self, slot: _Slot, latency: float, overloaded: bool) -> None:
+        if not overloaded and self.baseline is not None:
+            overloaded = latency > self.baseline * self.latency_tolerance
+
+        if overloaded:
+            if slot.started >= self._last_decrease:
+                self._limit = max(self.min_limit, self._limit * self.backoff)
+                self._last_decrease = time.monotonic()
+            return
+
+        if self.baseline is None:
+            self.baseline = latency
+        else:
+            self.baseline += self.smoothing * (latency - self.baseline)
+
+        if self.queue_depth or self.in_flight >= self.limit:
+            self._limit = min(self.max_limit, self._limit + 1 / self._limit)
@@ -1,3 +1,5 @@
+from typing import Literal, Optional
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -8,6 +10,18 @@ class Settings(BaseSettings):
     DB_PORT: int
     POSTGRES_USER: str
     POSTGRES_PASSWORD: str
+    XLS_CACHE_DIR: str = 'cache/xls'
+    XLS_CACHE_MAX_BYTES: int = 2 * 1024 ** 3
+    REDIS_URL: str = 'redis://localhost:6379'
+    CACHE_LOCAL_MAX_ENTRIES: int = 1024
+    CACHE_LOCAL_TTL: int = 60
+    HTTP_LIMIT_PER_HOST: int = 30
+    HTTP_TOTAL_TIMEOUT: float = 120
+    HTTP_READ_TIMEOUT: float = 30
+    HTTP_RETRIES: int = 3
+    HTTP_BACKOFF: float = 0.5
+    PARSE_WORKERS: Optional[int] = None
+    XLS_READER: Literal['xlrd', 'pandas'] = 'xlrd'
 
     model_config = SettingsConfigDict(
         env_file='.env', env_file_encoding='utf-8')
@@ -0,0 +1,36 @@
+import json
+from datetime import date
+from typing import Iterable
+
+from redis import asyncio as aioredis
+
+from core.config import settings
+from core.logger_setup import setup_logger
+
+INGESTED_DATES_CHANNEL = 'spimex:ingested-dates'
+PENDING_DATES_KEY = 'spimex:ingested-dates:pending'
+
+logger = setup_logger()
+
+
+async def publish_ingested_dates(dates: Iterable[date]) -> None:
+    """Сообщает API о датах торгов, данные за которые были записаны.
+
+    Если на канал никто не подписан, даты сохраняются в множестве
+    PENDING_DATES_KEY, и API обработает их при следующем запуске.
+    """
+
+    payload = sorted({trading_date.isoformat() for trading_date in dates})
+    if not payload:
+        return
+
+    redis = aioredis.from_url(settings.REDIS_URL)
+    try:
+        receivers = await redis.publish(
+            INGESTED_DATES_CHANNEL, json.dumps(payload))
+        if not receivers:
+            await redis.sadd(PENDING_DATES_KEY, *payload)
+    except Exception as e:
+        logger.warning(f'Не удалось опубликовать загруженные даты: {e}')
+    finally:
+        await redis.aclose()
@@ -0,0 +1,147 @@
+import asyncio
+import random
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Mapping, NamedTuple, Optional, Union
+
+import aiohttp
+
+from core.concurrency import report_overload
+from core.config import settings
+from core.logger_setup import setup_logger
+from core.metrics import HTTP_DOWNLOADED_BYTES, HTTP_FAILURES, HTTP_REQUESTS, HTTP_RETRIES
+
+RETRY_EXCEPTIONS = (
+    aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError)
+THROTTLED_STATUS = 429
+
+logger = setup_logger()
+
+
+class HttpResult(NamedTuple):
+    """Ответ, прочитанный целиком: статус, заголовки и тело."""
+
+    status: int
+    headers: Mapping[str, str]
+    body: Union[bytes, str]
+
+
+def body_size(response, body: Union[bytes, str]) -> int:
+    """Объем прочитанного тела ответа в байтах."""
+
+    content = getattr(response, 'content', None)
+    if content is not None and hasattr(content, 'total_bytes'):
+        return content.total_bytes
+    if isinstance(body, str):
+        return len(body.encode())
+    return len(body)
+
+
+class HttpClient:
+    """Общий HTTP-клиент парсера с пулом соединений и повторами запросов.
+
+    Соединения к сайту ограничены limit_per_host и переиспользуются, DNS
+    кэшируется. Ответы 429 и 5xx, обрывы соединения и таймауты повторяются
+    до retries раз с экспоненциальной задержкой со случайным разбросом и
+    сообщаются адаптивным лимитерам вызывающей задачи.
+    Счетчики запросов, повторов и ошибок ведутся за время жизни клиента и
+    в метриках процесса вместе с объемом прочитанных тел ответов.
+    Вместо собственной сессии можно передать готовую, например в тестах.
+    """
+
+    def __init__(
+        self, session: Optional[aiohttp.ClientSession] = None,
+        limit_per_host: int = settings.HTTP_LIMIT_PER_HOST,
+        total_timeout: float = settings.HTTP_TOTAL_TIMEOUT,
+        read_timeout: float = settings.HTTP_READ_TIMEOUT,
+        retries: int = settings.HTTP_RETRIES,
+        backoff: float = settings.HTTP_BACKOFF
+    ) -> None:
+        self.session = session
+        self.limit_per_host = limit_per_host
+        self.timeout = aiohttp.ClientTimeout(
+            total=total_timeout, sock_read=read_timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.stats: Dict[str, int] = {'requests': 0, 'retries': 0, 'failures': 0}
+        self._owns_session = session is None
+
+    async def __aenter__(self) -> 'HttpClient':
+        if self.session is None:
+            connector = aiohttp.TCPConnector(
+                limit_per_host=self.limit_per_host,
+                ttl_dns_cache=300,
+                keepalive_timeout=30,
+            )
+            self.session = aiohttp.ClientSession(
+                connector=connector, timeout=self.timeout)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        if self._owns_session and self.session is not None:
+            await self.session.close()
+            self.session = None
+        logger.info(
+            f'HTTP-запросов: {self.stats["requests"]}, '
+            f'повторов: {self.stats["retries"]}, '
+            f'ошибок: {self.stats["failures"]}'
+        )
+
+    async def fetch(self, url: str, text: bool = False, **kwargs) -> HttpResult:
+        """Выполняет GET-запрос и читает тело ответа целиком.
+
+        Повторяются и ошибки чтения тела (таймаут, обрыв соединения), поэтому
+        медленная загрузка файла не теряется после первой попытки. При
+        text=True тело декодируется в строку. После исчерпания повторов
+        возвращается последний ответ 429/5xx или пробрасывается последнее
+        исключение.
+        """
+
+        attempt = 0
+        while True:
+            self.stats['requests'] += 1
+            HTTP_REQUESTS.inc()
+            try:
+                async with self.session.get(url, **kwargs) as response:
+                    body = await (response.text() if text else response.read())
+                    result = HttpResult(response.status, response.headers, body)
+                HTTP_DOWNLOADED_BYTES.inc(body_size(response, body))
+            except RETRY_EXCEPTIONS as e:
+                report_overload()
+                if attempt >= self.retries:
+                    self.stats['failures'] += 1
+                    HTTP_FAILURES.inc()
+                    raise
+                reason = repr(e)
+            else:
+                transient = (
+                    result.status >= 500 or result.status == THROTTLED_STATUS)
+                if transient:
+                    report_overload()
+                if not transient or attempt >= self.retries:
+                    if transient:
+                        self.stats['failures'] += 1
+                        HTTP_FAILURES.inc()
+                    return result
+                reason = f'статус {result.status}'
+
+            attempt += 1
+            self.stats['retries'] += 1
+            HTTP_RETRIES.inc()
+            delay = random.uniform(0, self.backoff * 2 ** (attempt - 1))
+            logger.warning(
+                f'Повтор {attempt}/{self.retries} запроса {url} '
+                f'через {delay:.1f} с: {reason}'
+            )
+            await asyncio.sleep(delay)
+
+
+@asynccontextmanager
+async def open_client(http: Optional[HttpClient] = None) -> AsyncIterator[HttpClient]:
+    """Возвращает переданный клиент или открывает новый на время блока."""
+
+    if http is not None:
+        yield http
+        return
+
+    async with HttpClient() as http:
+        yield http
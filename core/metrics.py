@@ -0,0 +1,178 @@
+import json
+import time
+from contextlib import contextmanager
+from functools import wraps
+from pathlib import Path
+from typing import Dict, Iterator, Optional
+
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, write_to_textfile
+
+from core.logger_setup import setup_logger
+
+DEFAULT_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+STEP_BUCKETS = (1.0, 5.0, 15.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0, 3600.0)
+
+logger = setup_logger()
+
+registry = CollectorRegistry()
+started = time.monotonic()
+
+PIPELINE_STAGE_SECONDS = Histogram(
+    'spimex_pipeline_stage_seconds',
+    'Длительность отдельных операций загрузки по стадиям',
+    ['stage'], buckets=DEFAULT_BUCKETS, registry=registry)
+PIPELINE_STEP_SECONDS = Histogram(
+    'spimex_pipeline_step_seconds',
+    'Длительность шагов загрузки целиком',
+    ['step'], buckets=STEP_BUCKETS, registry=registry)
+PIPELINE_ROWS = Counter(
+    'spimex_pipeline_rows', 'Число строк, прошедших стадию',
+    ['stage'], registry=registry)
+PIPELINE_ROWS_PER_SECOND = Gauge(
+    'spimex_pipeline_rows_per_second',
+    'Средняя скорость стадии в строках в секунду за запуск',
+    ['stage'], registry=registry)
+PIPELINE_FAILED_BATCHES = Counter(
+    'spimex_pipeline_failed_batches', 'Число батчей, не сохраненных в базу',
+    registry=registry)
+QUEUE_DEPTH = Gauge(
+    'spimex_pipeline_queue_depth', 'Текущая длина очереди',
+    ['queue'], registry=registry)
+QUEUE_DEPTH_MAX = Gauge(
+    'spimex_pipeline_queue_depth_max', 'Наибольшая длина очереди за запуск',
+    ['queue'], registry=registry)
+HTTP_REQUESTS = Counter(
+    'spimex_http_requests', 'Число HTTP-запросов, включая повторы',
+    registry=registry)
+HTTP_RETRIES = Counter(
+    'spimex_http_retries', 'Число повторов HTTP-запросов', registry=registry)
+HTTP_FAILURES = Counter(
+    'spimex_http_failures', 'Число HTTP-запросов, не удавшихся после повторов',
+    registry=registry)
+HTTP_DOWNLOADED_BYTES = Counter(
+    'spimex_http_downloaded_bytes', 'Объем прочитанных тел HTTP-ответов',
+    registry=registry)
+
+_queue_depths: Dict[str, int] = {}
+_queue_depths_max: Dict[str, int] = {}
+
+
+def sample_value(name: str, **labels) -> float:
+    """Значение отсчета метрики процесса, 0 для еще не записанного."""
+
+    return registry.get_sample_value(name, labels) or 0
+
+
+def set_queue_depth(queue: str, depth: int) -> None:
+    """Запоминает текущую и наибольшую длину очереди."""
+
+    _queue_depths[queue] = depth
+    _queue_depths_max[queue] = max(_queue_depths_max.get(queue, depth), depth)
+    QUEUE_DEPTH.labels(queue=queue).set(depth)
+    QUEUE_DEPTH_MAX.labels(queue=queue).set(_queue_depths_max[queue])
+
+
+@contextmanager
+def queued(queue: str) -> Iterator[None]:
+    """Учитывает операцию в длине очереди на время блока."""
+
+    set_queue_depth(queue, _queue_depths.get(queue, 0) + 1)
+    try:
+        yield
+    finally:
+        set_queue_depth(queue, _queue_depths[queue] - 1)
+
+
+def timed_step(step: str):
+    """Декоратор корутины, измеряющий шаг загрузки целиком."""
+
+    def decorator(func):
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            with PIPELINE_STEP_SECONDS.labels(step=step).time():
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def format_labels(labels: Dict[str, str]) -> str:
+    """Метки отсчета в синтаксисе Prometheus для ключей JSON-сводки."""
+
+    if not labels:
+        return ''
+    return '{' + ','.join(
+        f'{name}="{value}"' for name, value in sorted(labels.items())) + '}'
+
+
+def summary(source: CollectorRegistry = registry) -> Dict[str, object]:
+    """Возвращает непустые метрики в виде словаря для JSON.
+
+    Для гистограмм вместо корзин выводятся число наблюдений, сумма и
+    среднее, для счетчиков и датчиков - значения по меткам.
+    """
+
+    metrics: Dict[str, object] = {}
+    for family in source.collect():
+        values: Dict[str, object] = {}
+        if family.type == 'histogram':
+            for sample in family.samples:
+                if sample.name.endswith(('_count', '_sum')):
+                    entry = values.setdefault(format_labels(sample.labels), {})
+                    entry[sample.name.rsplit('_', 1)[1]] = round(sample.value, 6)
+            for entry in values.values():
+                entry['mean'] = round(entry['sum'] / entry['count'], 6) if entry['count'] else 0
+        else:
+            values = {
+                format_labels(sample.labels): sample.value
+                for sample in family.samples if not sample.name.endswith('_created')
+            }
+        if values:
+            metrics[family.name] = values
+
+    return {
+        'elapsed_seconds': round(time.monotonic() - started, 3),
+        'metrics': metrics,
+    }
+
+
+def report_run(path: Optional[str] = None) -> Dict[str, object]:
+    """Подводит итоги запуска: скорость стадий, журнал и файл метрик.
+
+    Файл с расширением .prom пишется в текстовом формате Prometheus (для
+    textfile collector node_exporter), любой другой - JSON-сводкой.
+    """
+
+    elapsed = time.monotonic() - started
+    for family in PIPELINE_ROWS.collect():
+        for sample in family.samples:
+            if sample.name.endswith('_total'):
+                PIPELINE_ROWS_PER_SECOND.labels(**sample.labels).set(
+                    sample.value / elapsed if elapsed else 0)
+
+    stages: Dict[str, Dict[str, float]] = {}
+    for family in PIPELINE_STAGE_SECONDS.collect():
+        for sample in family.samples:
+            if sample.name.endswith(('_count', '_sum')):
+                totals = stages.setdefault(sample.labels['stage'], {})
+                totals[sample.name.rsplit('_', 1)[1]] = sample.value
+    for stage, totals in stages.items():
+        if totals['count']:
+            logger.info(
+                f'Стадия {stage}: операций {totals["count"]:.0f}, '
+                f'всего {totals["sum"]:.1f} с, '
+                f'в среднем {totals["sum"] / totals["count"]:.3f} с'
+            )
+
+    result = summary()
+    if path is not None:
+        target = Path(path)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        if target.suffix == '.prom':
+            write_to_textfile(str(target), registry)
+        else:
+            target.write_text(
+                json.dumps(result, ensure_ascii=False, indent=2), encoding='utf-8')
+        logger.info(f'Метрики запуска записаны в {target}')
+    return result
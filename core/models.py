@@ -1,7 +1,9 @@
 from datetime import datetime
 
-from sqlalchemy import Date, DateTime, Integer, String
-from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
+from sqlalchemy import (BigInteger, Date, DateTime, ForeignKey, Index, Integer,
+                        String, UniqueConstraint)
+from sqlalchemy.ext.associationproxy import association_proxy
+from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 
 
 class Base(DeclarativeBase):
@@ -10,17 +12,67 @@ class Base(DeclarativeBase):
     pass
 
 
+class Product(Base):
+    """Справочник инструментов: код и наименование инструмента."""
+
+    __tablename__ = 'products'
+    __table_args__ = (
+        UniqueConstraint(
+            'exchange_product_id', 'exchange_product_name',
+            name='uq_products_exchange_product_id_name'),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    exchange_product_id: Mapped[str] = mapped_column(String, nullable=False)
+    exchange_product_name: Mapped[str] = mapped_column(String, nullable=False)
+
+
+class DeliveryBasis(Base):
+    """Справочник базисов поставки: код и наименование базиса."""
+
+    __tablename__ = 'delivery_bases'
+    __table_args__ = (
+        UniqueConstraint(
+            'delivery_basis_id', 'delivery_basis_name',
+            name='uq_delivery_bases_delivery_basis_id_name'),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    delivery_basis_id: Mapped[str] = mapped_column(String(3), nullable=False)
+    delivery_basis_name: Mapped[str] = mapped_column(String, nullable=False)
+
+
 class SpimexTradingResult(Base):
-    """Модель для хранения результатов торгов на СПИМЭКС."""
+    """Модель для хранения результатов торгов на СПИМЭКС.
+
+    В PostgreSQL таблица секционирована по годам поля date (см.
+    core.partitions), и первичный ключ в базе - (id, date). Наименования
+    инструмента и базиса хранятся в справочниках products и delivery_bases
+    и подгружаются соединением при выборке записи.
+    """
 
     __tablename__ = 'spimex_trading_results'
+    __table_args__ = (
+        UniqueConstraint(
+            'date', 'exchange_product_id',
+            name='uq_spimex_trading_results_date_exchange_product_id'),
+        Index('ix_spimex_trading_results_date_id', 'date', 'id'),
+        Index(
+            'ix_spimex_trading_results_oil_type_basis_date',
+            'oil_id', 'delivery_type_id', 'delivery_basis_id', 'date'),
+        Index(
+            'ix_spimex_trading_results_basis_date',
+            'delivery_basis_id', 'date'),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     exchange_product_id: Mapped[str] = mapped_column(String, nullable=False)
-    exchange_product_name: Mapped[str] = mapped_column(String, nullable=False)
+    product_key: Mapped[int] = mapped_column(
+        ForeignKey('products.id'), nullable=False)
     oil_id: Mapped[str] = mapped_column(String(4), nullable=False)
     delivery_basis_id: Mapped[str] = mapped_column(String(3), nullable=False)
-    delivery_basis_name: Mapped[str] = mapped_column(String, nullable=False)
+    delivery_basis_key: Mapped[int] = mapped_column(
+        ForeignKey('delivery_bases.id'), nullable=False)
     delivery_type_id: Mapped[str] = mapped_column(String(1), nullable=False)
     volume: Mapped[int] = mapped_column(Integer, nullable=False)
     total: Mapped[int] = mapped_column(Integer, nullable=False)
@@ -32,3 +84,52 @@ class SpimexTradingResult(Base):
     updated_on: Mapped[datetime] = mapped_column(
         DateTime, default=lambda: datetime.now().replace(microsecond=0)
     )
+
+    product: Mapped[Product] = relationship(lazy='joined', innerjoin=True)
+    delivery_basis: Mapped[DeliveryBasis] = relationship(
+        lazy='joined', innerjoin=True)
+    exchange_product_name = association_proxy('product', 'exchange_product_name')
+    delivery_basis_name = association_proxy(
+        'delivery_basis', 'delivery_basis_name')
+
+
+class IngestState(Base):
+    """Отметка о последней загруженной дате торгов для инкрементальной загрузки."""
+
+    __tablename__ = 'ingest_state'
+
+    name: Mapped[str] = mapped_column(String, primary_key=True)
+    last_date: Mapped[datetime.date] = mapped_column(Date, nullable=False)
+    updated_on: Mapped[datetime] = mapped_column(
+        DateTime, default=lambda: datetime.now().replace(microsecond=0),
+        onupdate=lambda: datetime.now().replace(microsecond=0)
+    )
+
+
+class TradingDay(Base):
+    """Сводка по торговому дню, обновляемая при загрузке данных."""
+
+    __tablename__ = 'trading_days'
+
+    date: Mapped[datetime.date] = mapped_column(Date, primary_key=True)
+    row_count: Mapped[int] = mapped_column(Integer, nullable=False)
+    total_volume: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    total_value: Mapped[int] = mapped_column(BigInteger, nullable=False)
+
+
+class TradingDailyRollup(Base):
+    """Итоги торгов за день по нефтепродукту, базису и типу поставки.
+
+    Пересчитываются при загрузке данных только для загруженных дат.
+    """
+
+    __tablename__ = 'trading_daily_rollups'
+
+    date: Mapped[datetime.date] = mapped_column(Date, primary_key=True)
+    oil_id: Mapped[str] = mapped_column(String(4), primary_key=True)
+    delivery_basis_id: Mapped[str] = mapped_column(String(3), primary_key=True)
+    delivery_type_id: Mapped[str] = mapped_column(String(1), primary_key=True)
+    row_count: Mapped[int] = mapped_column(Integer, nullable=False)
+    volume: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    total: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    count: Mapped[int] = mapped_column(BigInteger, nullable=False)
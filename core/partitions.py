@@ -0,0 +1,140 @@
+import re
+from datetime import date
+from typing import Iterable, List, Set, Tuple
+
+from sqlalchemy import func, select, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.logger_setup import setup_logger
+
+PARTITIONED_TABLE = 'spimex_trading_results'
+PARTITIONS_LOCK = 7302
+PARTITION_NAME_PATTERN = re.compile(rf'{PARTITIONED_TABLE}_(y\d{{4}}|default)')
+
+logger = setup_logger()
+
+_known_partitions: Set[Tuple[str, int]] = set()
+
+
+def partition_name(year: int, table: str = PARTITIONED_TABLE) -> str:
+    """Имя годового раздела таблицы."""
+
+    return f'{table}_y{year}'
+
+
+def is_partition_name(name: str) -> bool:
+    """Проверяет, что имя таблицы - имя раздела, в том числе отсоединенного."""
+
+    return PARTITION_NAME_PATTERN.fullmatch(name) is not None
+
+
+def partition_bounds(year: int) -> str:
+    """Границы годового раздела для FOR VALUES."""
+
+    return f"FROM ('{year}-01-01') TO ('{year + 1}-01-01')"
+
+
+async def is_partitioned(
+    session: AsyncSession, table: str = PARTITIONED_TABLE
+) -> bool:
+    """Проверяет, что таблица секционирована (только PostgreSQL)."""
+
+    if session.get_bind().dialect.name != 'postgresql':
+        return False
+
+    result = await session.execute(
+        text(
+            'SELECT EXISTS (SELECT 1 FROM pg_partitioned_table '
+            'WHERE partrelid = to_regclass(:table))'
+        ),
+        {'table': table},
+    )
+    return result.scalar()
+
+
+async def list_partitions(
+    session: AsyncSession, table: str = PARTITIONED_TABLE
+) -> List[Tuple[str, str]]:
+    """Возвращает имена разделов таблицы и их границы."""
+
+    result = await session.execute(
+        text(
+            'SELECT child.relname, pg_get_expr(child.relpartbound, child.oid) '
+            'FROM pg_inherits '
+            'JOIN pg_class AS child ON child.oid = pg_inherits.inhrelid '
+            'WHERE pg_inherits.inhparent = to_regclass(:table) '
+            'ORDER BY child.relname'
+        ),
+        {'table': table},
+    )
+    return [(name, bounds) for name, bounds in result]
+
+
+async def ensure_partitions(
+    session: AsyncSession, dates: Iterable[date],
+    table: str = PARTITIONED_TABLE
+) -> None:
+    """Создает недостающие годовые разделы для дат в текущей транзакции.
+
+    Разделы создаются под транзакционной блокировкой, поэтому параллельные
+    батчи не создают один раздел дважды. Если строки года уже попали в
+    раздел по умолчанию, раздел не создается и строки остаются там.
+    Для несекционированной таблицы ничего не делается.
+    """
+
+    years = {trading_date.year for trading_date in dates}
+    years = {year for year in years if (table, year) not in _known_partitions}
+    if not years or not await is_partitioned(session, table):
+        return
+
+    await session.execute(select(func.pg_advisory_xact_lock(PARTITIONS_LOCK)))
+    for year in sorted(years):
+        name = partition_name(year, table)
+        exists = await session.execute(
+            text('SELECT to_regclass(:name) IS NOT NULL'), {'name': name})
+        if exists.scalar():
+            _known_partitions.add((table, year))
+            continue
+
+        try:
+            async with session.begin_nested():
+                await session.execute(text(
+                    f'CREATE TABLE {name} PARTITION OF {table} '
+                    f'FOR VALUES {partition_bounds(year)}'
+                ))
+            logger.info(f'Создан раздел {name}')
+        except DBAPIError as e:
+            logger.warning(
+                f'Не удалось создать раздел {name}, строки останутся в '
+                f'разделе по умолчанию: {e}'
+            )
+
+
+async def detach_partition(
+    session: AsyncSession, year: int, table: str = PARTITIONED_TABLE
+) -> str:
+    """Отсоединяет годовой раздел и возвращает имя получившейся таблицы.
+
+    Отсоединенная таблица больше не участвует в запросах и может быть
+    выгружена (pg_dump -t) и удалена или присоединена обратно через
+    attach_partition.
+    """
+
+    name = partition_name(year, table)
+    await session.execute(text(f'ALTER TABLE {table} DETACH PARTITION {name}'))
+    _known_partitions.discard((table, year))
+    return name
+
+
+async def attach_partition(
+    session: AsyncSession, year: int, table: str = PARTITIONED_TABLE
+) -> str:
+    """Присоединяет ранее отсоединенный годовой раздел."""
+
+    name = partition_name(year, table)
+    await session.execute(text(
+        f'ALTER TABLE {table} ATTACH PARTITION {name} '
+        f'FOR VALUES {partition_bounds(year)}'
+    ))
+    return name
@@ -1,7 +1,27 @@
-from typing import Optional
+from typing import Iterator, Mapping, NamedTuple, Optional, Tuple
 from pydantic import BaseModel, ConfigDict, Field, model_validator
 from datetime import date
 
+import numpy as np
+
+STRING_FIELDS = ('exchange_product_id', 'exchange_product_name', 'delivery_basis_name')
+INTEGER_FIELDS = ('volume', 'total', 'count')
+
+
+class TradingRow(NamedTuple):
+    """Запись результата торгов, разобранная из бюллетеня."""
+
+    exchange_product_id: str
+    exchange_product_name: str
+    oil_id: str
+    delivery_basis_id: str
+    delivery_basis_name: str
+    delivery_type_id: str
+    volume: int
+    total: int
+    count: int
+    date: date
+
 
 class SpimexTradingResultSchema(BaseModel):
     exchange_product_id: str = Field(..., alias='Код\nИнструмента')
@@ -25,3 +45,65 @@ class SpimexTradingResultSchema(BaseModel):
         return model
 
     model_config = ConfigDict(populate_by_name=True)
+
+    def to_row(self) -> TradingRow:
+        """Преобразует запись в кортеж для сохранения в базу."""
+
+        return TradingRow(**self.model_dump(include=set(TradingRow._fields)))
+
+
+def split_product_ids(product_ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Выделяет oil_id, delivery_basis_id и delivery_type_id из кодов инструментов.
+
+    Работает со всем столбцом сразу: массив строк фиксированной ширины
+    рассматривается как матрица символов, из которой берутся срезы [:4],
+    [4:7] и последний символ каждой строки.
+    """
+
+    width = max(product_ids.dtype.itemsize // 4, 7)
+    chars = product_ids.astype(f'U{width}').view('U1').reshape(len(product_ids), width)
+    oil_ids = np.ascontiguousarray(chars[:, :4]).view('U4').ravel()
+    basis_ids = np.ascontiguousarray(chars[:, 4:7]).view('U3').ravel()
+    lengths = np.char.str_len(product_ids)
+    type_ids = chars[np.arange(len(product_ids)), lengths - 1]
+    return oil_ids, basis_ids, type_ids
+
+
+def validate_trading_columns(
+    columns: Mapping[str, np.ndarray], trading_date: date
+) -> Iterator[TradingRow]:
+    """Проверяет столбцы бюллетеня и возвращает записи, готовые для базы.
+
+    Пакетный аналог SpimexTradingResultSchema: строковые столбцы не должны
+    содержать пустых значений, числовые - пропусков и дробных чисел. Ошибка
+    в любой строке отклоняет весь бюллетень с ValueError. Коды oil_id,
+    delivery_basis_id и delivery_type_id вычисляются по столбцу целиком.
+    """
+
+    for name in STRING_FIELDS:
+        empty = columns[name] == ''
+        if empty.any():
+            raise ValueError(f'Пустые значения в столбце {name}: {int(empty.sum())}')
+
+    numbers = {}
+    for name in INTEGER_FIELDS:
+        values = columns[name]
+        invalid = ~np.isfinite(values) | (values != np.floor(values))
+        if invalid.any():
+            raise ValueError(f'Нецелые значения в столбце {name}: {int(invalid.sum())}')
+        numbers[name] = values.astype(np.int64).tolist()
+
+    product_ids = columns['exchange_product_id']
+    oil_ids, basis_ids, type_ids = split_product_ids(product_ids)
+    return map(TradingRow._make, zip(
+        product_ids.tolist(),
+        columns['exchange_product_name'].tolist(),
+        oil_ids.tolist(),
+        basis_ids.tolist(),
+        columns['delivery_basis_name'].tolist(),
+        type_ids.tolist(),
+        numbers['volume'],
+        numbers['total'],
+        numbers['count'],
+        [trading_date] * len(product_ids),
+    ))
@@ -1,29 +1,77 @@
-from datetime import date, datetime
+from contextlib import nullcontext
+from datetime import date, datetime, timedelta
 from io import BytesIO
-from typing import List, Optional, Tuple
+from typing import Awaitable, Callable, Dict, List, NamedTuple, Optional, Set, Tuple, Union
+from weakref import WeakKeyDictionary
 
+import numpy as np
 import pandas as pd
-import requests
+import xlrd
 import asyncio
-import aiohttp
-from typing import Callable
 from aioprocessing import AioPool
 import multiprocessing
 from tqdm.asyncio import tqdm_asyncio
 from bs4 import BeautifulSoup
-from pydantic import TypeAdapter
-from sqlalchemy import select, insert
+from lxml import etree
+from sqlalchemy import delete, func, insert, select, text, tuple_
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
+from core.concurrency import AdaptiveLimiter, report_overload
+from core.config import settings
 from core.database import async_session
+from core.events import publish_ingested_dates
+from core.http_client import HttpClient, open_client
 from core.logger_setup import setup_logger
-from core.models import SpimexTradingResult
-from core.schemas import SpimexTradingResultSchema
+from core.metrics import (PIPELINE_FAILED_BATCHES, PIPELINE_ROWS, PIPELINE_STAGE_SECONDS, queued, set_queue_depth,
+                          timed_step)
+from core.models import (DeliveryBasis, IngestState, Product, SpimexTradingResult, TradingDailyRollup,
+                         TradingDay)
+from core.partitions import ensure_partitions
+from core.schemas import SpimexTradingResultSchema, TradingRow, validate_trading_columns
+from core.xls_cache import XlsCache
 
 BASE_URL = 'https://spimex.com'
 RELATIVE_URL = '/markets/oil_products/trades/results/'
 TABLE_NAME = 'Единица измерения: Метрическая тонна'
 TABLE_END = 'Итого:'
+INGEST_STATE_NAME = 'spimex_trading_results'
+TRADING_DATES_LOCK = 7301
+PAGE_WORKERS = 8
+DOWNLOAD_WORKERS = 10
+MAX_DOWNLOAD_WORKERS = 100
+DB_WORKERS = 2
+MAX_DB_WORKERS = 10
+LISTING_ITEMS_XPATH = etree.XPath(
+    "//div[contains(concat(' ', normalize-space(@class), ' '), ' accordeon-inner__wrap-item ')]")
+LISTING_HREF_XPATH = etree.XPath(
+    "string(((.//div[contains(concat(' ', normalize-space(@class), ' '), "
+    "' accordeon-inner__header ')])[1]//a)[1]/@href)")
+LISTING_DATE_XPATH = etree.XPath('string((.//span)[1])')
+FACT_COLUMNS = (
+    'exchange_product_id', 'product_key', 'oil_id', 'delivery_basis_id',
+    'delivery_basis_key', 'delivery_type_id', 'volume', 'total', 'count',
+    'date',
+)
+COPY_COLUMNS = FACT_COLUMNS + ('created_on', 'updated_on')
+NATURAL_KEY = ('date', 'exchange_product_id')
+UPSERT_COLUMNS = (
+    'product_key', 'oil_id', 'delivery_basis_id', 'delivery_basis_key',
+    'delivery_type_id', 'volume', 'total', 'count', 'updated_on',
+)
+COPY_STAGE_TABLE = 'spimex_trading_results_stage'
+COPY_STAGE_SQL = (
+    f'CREATE TEMP TABLE {COPY_STAGE_TABLE} ON COMMIT DROP AS '
+    f'SELECT {", ".join(COPY_COLUMNS)} FROM spimex_trading_results '
+    'WITH NO DATA'
+)
+COPY_MERGE_SQL = (
+    f'INSERT INTO spimex_trading_results ({", ".join(COPY_COLUMNS)}) '
+    f'SELECT {", ".join(COPY_COLUMNS)} FROM {COPY_STAGE_TABLE} '
+    f'ON CONFLICT ({", ".join(NATURAL_KEY)}) DO UPDATE SET '
+    + ', '.join(f'{column} = EXCLUDED.{column}' for column in UPSERT_COLUMNS)
+)
 HEADERS = {
     1: ('Код\nИнструмента', 'exchange_product_id'),
     2: ('Наименование\nИнструмента', 'exchange_product_name'),
@@ -34,7 +82,12 @@ HEADERS = {
     7: ('', 'date'),
 }
 
+STRING_COLUMNS = [HEADERS[i] for i in range(1, 4)]
+NUMERIC_COLUMNS = [HEADERS[i] for i in range(4, 7)]
+
 logger = setup_logger()
+_parse_pool: Optional[AioPool] = None
+_dimension_keys: WeakKeyDictionary = WeakKeyDictionary()
 
 
 def input_dates() -> Tuple[date, date]:
@@ -72,12 +125,21 @@ def input_dates() -> Tuple[date, date]:
             print('Неверный формат даты. Повторите ввод.')
 
 
-def get_last_page_number() -> int:
-    """Получает номер последней страницы с результатами торгов."""
+async def get_last_page_number(
+    session: HttpClient, pages: Optional['ListingPages'] = None
+) -> int:
+    """Получает номер последней страницы с результатами торгов.
+
+    Если передан pages, загружается первая страница списка, и ее бюллетени
+    сохраняются в pages, чтобы поиск границ не запрашивал ее повторно.
+    """
 
-    url = f'{BASE_URL}{RELATIVE_URL}'
-    response = requests.get(url)
-    soup = BeautifulSoup(response.text, 'lxml')
+    url = ListingPages.url(1) if pages is not None else f'{BASE_URL}{RELATIVE_URL}'
+    with PIPELINE_STAGE_SECONDS.labels(stage='page_fetch').time():
+        html = (await session.fetch(url, text=True)).body
+    if pages is not None:
+        pages.seed(1, html)
+    soup = BeautifulSoup(html, 'lxml')
     pagination = soup.find('div', attrs={'class': 'bx-pagination-container'})
 
     page_numbers = []
@@ -89,86 +151,175 @@ def get_last_page_number() -> int:
     return max(page_numbers)
 
 
+class ListingItem(NamedTuple):
+    """Бюллетень в списке: ссылка на файл и дата торгов."""
+
+    href: Optional[str]
+    date: Optional[date]
+
+
+def parse_listing_items(html: str) -> List[ListingItem]:
+    """Извлекает бюллетени со страницы списка через XPath lxml.
+
+    Вместо дерева BeautifulSoup строится только дерево lxml, из которого
+    читаются ссылка из заголовка и первая дата каждого бюллетеня.
+    """
+
+    root = etree.HTML(html) if html and html.strip() else None
+    if root is None:
+        return []
+
+    items = []
+    for element in LISTING_ITEMS_XPATH(root):
+        try:
+            item_date = datetime.strptime(
+                LISTING_DATE_XPATH(element).strip(), '%d.%m.%Y').date()
+        except ValueError:
+            item_date = None
+        items.append(ListingItem(LISTING_HREF_XPATH(element) or None, item_date))
+    return items
+
+
+class ListingPages:
+    """Страницы списка бюллетеней, загружаемые не более одного раза за запуск.
+
+    Страницы, запрошенные при поиске границ, хранятся разобранными до тех
+    пор, пока их не заберет извлечение ссылок; остальные страницы
+    загружаются без сохранения.
+    """
+
+    def __init__(self, session: HttpClient) -> None:
+        self.session = session
+        self._pages: Dict[int, asyncio.Future] = {}
+
+    @staticmethod
+    def url(page_number: int) -> str:
+        return f'{BASE_URL}{RELATIVE_URL}?page=page-{page_number}'
+
+    def seed(self, page_number: int, html: str) -> None:
+        """Сохраняет страницу, уже загруженную в другом месте."""
+
+        future = asyncio.get_running_loop().create_future()
+        with PIPELINE_STAGE_SECONDS.labels(stage='page_parse').time():
+            future.set_result(parse_listing_items(html))
+        self._pages[page_number] = future
+
+    async def get(self, page_number: int) -> Optional[List[ListingItem]]:
+        """Возвращает страницу и сохраняет ее для повторного использования."""
+
+        if page_number not in self._pages:
+            self._pages[page_number] = asyncio.create_task(
+                self._fetch(page_number))
+        return await self._pages[page_number]
+
+    async def take(self, page_number: int) -> Optional[List[ListingItem]]:
+        """Возвращает страницу, освобождая ее сохраненную копию."""
+
+        if page_number in self._pages:
+            return await self._pages.pop(page_number)
+        return await self._fetch(page_number)
+
+    async def _fetch(self, page_number: int) -> Optional[List[ListingItem]]:
+        url = self.url(page_number)
+        try:
+            with PIPELINE_STAGE_SECONDS.labels(stage='page_fetch').time():
+                html = (await self.session.fetch(url, text=True)).body
+        except Exception as e:
+            logger.error(f'Ошибка при загрузке страницы {url}: {e}')
+            return None
+        with PIPELINE_STAGE_SECONDS.labels(stage='page_parse').time():
+            return parse_listing_items(html)
+
+
+async def find_first_page(
+    left: int, right: int, check_condition: Callable[[int], Awaitable[bool]],
+    arity: int
+) -> Optional[int]:
+    """Находит первую страницу, для которой выполняется монотонное условие.
+
+    За один шаг параллельно проверяются arity опорных страниц, поэтому
+    поиск занимает log_(arity + 1) N последовательных запросов.
+    """
+
+    result = None
+    while left <= right:
+        if right - left + 1 <= arity:
+            pivots = list(range(left, right + 1))
+        else:
+            step = (right - left + 1) / (arity + 1)
+            pivots = sorted({left + int(step * i) for i in range(1, arity + 1)})
+
+        checks = await asyncio.gather(*[check_condition(p) for p in pivots])
+        if not any(checks):
+            left = pivots[-1] + 1
+            continue
+
+        index = checks.index(True)
+        result = pivots[index]
+        right = pivots[index] - 1
+        if index:
+            left = pivots[index - 1] + 1
+    return result
+
+
 async def find_page_bounds_binary(
-    session: aiohttp.ClientSession, total_pages: int,
+    session: HttpClient, total_pages: int,
     cutoff_start_date: date, cutoff_end_date: date,
+    pages: Optional[ListingPages] = None, arity: int = 4
 ) -> Tuple[int, int]:
-    """Получает начальную и конечную страницу для парсинга."""
+    """Получает начальную и конечную страницу для парсинга.
+
+    Обе границы ищутся одновременно k-арным поиском; загруженные при этом
+    страницы сохраняются в pages и повторно не запрашиваются.
+    """
+
+    pages = pages or ListingPages(session)
 
     async def get_page_dates(page_number: int) -> List[date]:
-        url = f'{BASE_URL}{RELATIVE_URL}?page=page-{page_number}'
-        try:
-            async with session.get(url) as response:
-                html = await response.text()
-        except Exception as e:
-            logger.error(f'Ошибка при загрузке страницы {url}: {e}')
-            return []
+        items = await pages.get(page_number)
+        return [item.date for item in items or [] if item.date is not None]
 
-        soup = BeautifulSoup(html, 'lxml')
-        items = soup.find_all(
-            'div', attrs={'class': 'accordeon-inner__wrap-item'})
-        dates = []
-        for item in items:
-            try:
-                date_str = item.find('span').text.strip()
-                parsed_date = datetime.strptime(date_str, '%d.%m.%Y').date()
-                dates.append(parsed_date)
-            except Exception:
-                continue
-        return dates
-
-    async def binary_search(
-        left: int, right: int, check_condition: Callable[[List[date]], bool],
-        find_first: bool
-    ) -> int:
-
-        result = 0
-        while left <= right:
-            mid = (left + right) // 2
-            dates = await get_page_dates(mid)
-
-            if check_condition(dates):
-                result = mid
-                if find_first:
-                    right = mid - 1
-                else:
-                    left = mid + 1
-            else:
-                if find_first:
-                    left = mid + 1
-                else:
-                    right = mid - 1
-        return result
+    async def has_end_date(page_number: int) -> bool:
+        dates = await get_page_dates(page_number)
+        return any(d <= cutoff_end_date for d in dates)
 
-    start_page = await binary_search(
-        1, total_pages,
-        lambda dates: any(d <= cutoff_end_date for d in dates),
-        find_first=True)
+    async def before_start_date(page_number: int) -> bool:
+        dates = await get_page_dates(page_number)
+        return not any(d >= cutoff_start_date for d in dates)
 
-    end_page = await binary_search(
-        start_page, total_pages,
-        lambda dates: any(d >= cutoff_start_date for d in dates),
-        find_first=False)
+    start_page, after_end_page = await asyncio.gather(
+        find_first_page(1, total_pages, has_end_date, arity),
+        find_first_page(1, total_pages, before_start_date, arity),
+    )
 
-    return start_page, end_page
+    if after_end_page is None:
+        end_page = total_pages
+    else:
+        end_page = after_end_page - 1
+    return start_page or 0, end_page
 
 
+@timed_step('parse_all_pages')
 async def parse_all_pages(
-    cutoff_start_date: date, cutoff_end_date: date
+    cutoff_start_date: date, cutoff_end_date: date,
+    http: Optional[HttpClient] = None
 ) -> List[Tuple[str, date]]:
     """Асинхронный парсинг всех страниц с результатами торгов."""
 
-    last_page_number = get_last_page_number()
     stop_event = asyncio.Event()
-    semaphore = asyncio.Semaphore(30)
+    limiter = AdaptiveLimiter(
+        PAGE_WORKERS, max_limit=settings.HTTP_LIMIT_PER_HOST, name='pages')
 
     logger.info(
         f'Поиск записей за период с {cutoff_start_date} по {cutoff_end_date}.'
     )
 
-    async with aiohttp.ClientSession() as session:
+    async with open_client(http) as session:
+        pages = ListingPages(session)
+        last_page_number = await get_last_page_number(session, pages)
         start_page, end_page = await find_page_bounds_binary(
-            session, last_page_number, cutoff_start_date, cutoff_end_date)
+            session, last_page_number, cutoff_start_date, cutoff_end_date,
+            pages=pages)
 
         logger.info(f'Обрабатываем страницы с {start_page} по {end_page}.')
 
@@ -176,12 +327,12 @@ async def parse_all_pages(
             if stop_event.is_set():
                 return []
 
-            url = f'{BASE_URL}{RELATIVE_URL}?page=page-{page_number}'
+            url = ListingPages.url(page_number)
 
-            async with semaphore:
+            async with limiter:
                 xls_links, stop_flag = await get_xls_links_from_page(
                     session, url, cutoff_start_date, cutoff_end_date,
-                    page_number)
+                    page_number, pages=pages)
 
                 if stop_flag:
                     stop_event.set()
@@ -199,40 +350,51 @@ async def parse_all_pages(
             links = await completed
             all_results.extend(links)
 
-        logger.info(f'Всего ссылок на XLS-файлы найдено: {len(all_results)}')
+        logger.info(
+            f'Всего ссылок на XLS-файлы найдено: {len(all_results)}. '
+            f'Лимит параллельных запросов страниц: {limiter.limit}.'
+        )
         return list(reversed(all_results))
 
 
 async def get_xls_links_from_page(
-    session: aiohttp.ClientSession,
+    session: HttpClient,
     url: str,
     cutoff_start_date: date,
     cutoff_end_date: date,
-    page_number: int
+    page_number: int,
+    pages: Optional[ListingPages] = None,
+    raise_errors: bool = False
 ) -> Tuple[List[Tuple[str, date]], bool]:
-    """Асинхронно получает ссылки на XLS-файлы с указанной страницы."""
+    """Асинхронно получает ссылки на XLS-файлы с указанной страницы.
 
-    try:
-        async with session.get(url) as response:
-            html = await response.text()
-    except Exception as e:
-        logger.error(f'Ошибка при загрузке страницы {url}: {e}')
-        return [], False
+    Страница, которую не удалось загрузить, считается пустой; при
+    raise_errors=True ошибка загрузки пробрасывается вызывающему.
+    """
+
+    if pages is not None:
+        items = await pages.take(page_number)
+        if items is None:
+            return [], False
+    else:
+        try:
+            with PIPELINE_STAGE_SECONDS.labels(stage='page_fetch').time():
+                html = (await session.fetch(url, text=True)).body
+        except Exception as e:
+            logger.error(f'Ошибка при загрузке страницы {url}: {e}')
+            if raise_errors:
+                raise
+            return [], False
+        with PIPELINE_STAGE_SECONDS.labels(stage='page_parse').time():
+            items = parse_listing_items(html)
 
-    soup = BeautifulSoup(html, 'lxml')
     xls_links: List[Tuple[str, date]] = []
     stop_flag = False
 
-    items = soup.find_all('div', attrs={'class': 'accordeon-inner__wrap-item'})
-    for item in items:
-        xls_tag = item.find('div', class_='accordeon-inner__header').find('a')
-        if not xls_tag or 'reports' not in xls_tag['href']:
+    for xls_url, xls_date in items:
+        if not xls_url or 'reports' not in xls_url or xls_date is None:
             continue
 
-        xls_url = xls_tag['href']
-        xls_date_str = item.find('span').text.strip()
-        xls_date = datetime.strptime(xls_date_str, '%d.%m.%Y').date()
-
         if cutoff_end_date >= xls_date >= cutoff_start_date:
             full_xls_url = BASE_URL + xls_url
             xls_links.append((full_xls_url, xls_date))
@@ -249,172 +411,814 @@ async def get_xls_links_from_page(
     return xls_links, stop_flag
 
 
-def sync_parse_xls(content: bytes, xls_date: date) -> list[dict]:
-    """Синхронно парсит XLS-файл и возвращает данные в виде списка словарей."""
+def find_rows_containing(sheet: pd.DataFrame, text: str) -> np.ndarray:
+    """Возвращает индексы строк листа, в ячейках которых встречается текст."""
+
+    mask = sheet.astype(str).apply(
+        lambda column: column.str.contains(text, case=False, regex=False)
+    ).any(axis=1)
+    return np.flatnonzero(mask.to_numpy())
+
+
+def read_trading_table(content: bytes, xls_date: date) -> pd.DataFrame:
+    """Читает из XLS-файла таблицу торгов в метрических тоннах."""
 
     sheet = pd.read_excel(BytesIO(content), header=None, engine='xlrd')
-    header_index: Optional[int] = None
-    for i in range(len(sheet)):
-        row = sheet.iloc[i]
-        if row.astype(str).str.contains(TABLE_NAME, case=False).any():
-            header_index = i + 1
-            break
+    header_rows = find_rows_containing(sheet, TABLE_NAME)
+    if not len(header_rows):
+        return pd.DataFrame()
 
-    if header_index is None:
-        return []
+    header_index = int(header_rows[0]) + 1
+    first_row = header_index + 2
+    body = sheet.iloc[first_row:]
 
-    table_rows = []
-    for k in range(header_index + 2, len(sheet)):
-        row_data = sheet.iloc[k]
-        if (
-            row_data.astype(str).str.contains(TABLE_END, case=False).any()
-            or row_data.isnull().all()
-        ):
-            break
-        table_rows.append(row_data)
+    end_rows = np.flatnonzero(body.isnull().all(axis=1).to_numpy())
+    total_rows = find_rows_containing(body, TABLE_END)
+    stops = np.concatenate([end_rows, total_rows, [len(body)]])
+    df = body.iloc[:int(stops.min())]
 
-    if not table_rows:
-        return []
+    if df.empty:
+        return pd.DataFrame()
 
-    df = pd.DataFrame(table_rows)
-    df.columns = sheet.iloc[header_index]
+    df = df.set_axis(sheet.iloc[header_index], axis=1)
+    df = df[[HEADERS[i][0] for i in range(1, 7)]].copy()
     df[HEADERS[7][1]] = xls_date
     df[HEADERS[6][0]] = pd.to_numeric(df[HEADERS[6][0]], errors='coerce')
     df_filtered = df[df[HEADERS[6][0]].fillna(0).astype(int) > 0].copy()
     df_filtered[HEADERS[6][0]] = df_filtered[HEADERS[6][0]].astype(int)
-    df_filtered = df_filtered.reset_index(drop=True)
-    df_filtered = df_filtered[
-        [
-            HEADERS[1][0],
-            HEADERS[2][0],
-            HEADERS[3][0],
-            HEADERS[4][0],
-            HEADERS[5][0],
-            HEADERS[6][0],
-            HEADERS[7][1],
+    return df_filtered.reset_index(drop=True)
+
+
+def sync_parse_xls(content: bytes, xls_date: date) -> list[dict]:
+    """Синхронно парсит XLS-файл и возвращает данные в виде списка словарей."""
+
+    return read_trading_table(content, xls_date).to_dict(orient='records')
+
+
+def xlrd_value(value):
+    """Приводит значение ячейки xlrd к тому, что вернул бы pandas.read_excel."""
+
+    if value == '':
+        return None
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def xlrd_number(value) -> float:
+    """Преобразует значение ячейки в число, как pd.to_numeric(errors='coerce')."""
+
+    if value is None:
+        return np.nan
+    try:
+        return float(value)
+    except ValueError:
+        return np.nan
+
+
+def read_trading_columns(content: bytes) -> Dict[str, np.ndarray]:
+    """Читает таблицу торгов в метрических тоннах через API листа xlrd.
+
+    В отличие от read_trading_table, лист не превращается в DataFrame:
+    просматриваются только строки от заголовка таблицы до строки "Итого:",
+    и из каждой берутся лишь нужные столбцы. Пустые строки пропускаются, как
+    это делает pandas.read_excel, поэтому результат совпадает с разбором
+    через pandas.
+    """
+
+    table_name, table_end = TABLE_NAME.upper(), TABLE_END.upper()
+    headers = STRING_COLUMNS + NUMERIC_COLUMNS
+    data: Dict[str, list] = {name: [] for _, name in headers}
+
+    def contains(values: list, text: str) -> bool:
+        return any(isinstance(v, str) and text in v.upper() for v in values)
+
+    book = xlrd.open_workbook(
+        file_contents=content, on_demand=True, ragged_rows=True)
+    try:
+        sheet = book.sheet_by_index(0)
+        rows = (sheet.row_values(row) for row in range(sheet.nrows))
+        rows = (values for values in rows if any(v != '' for v in values))
+
+        names = None
+        for values in rows:
+            if contains(values, table_name):
+                names = next(rows, [])
+                next(rows, None)
+                break
+
+        if names is not None:
+            positions = [names.index(header) for header, _ in headers]
+            for values in rows:
+                if contains(values, table_end):
+                    break
+                values = values + [''] * (len(names) - len(values))
+                count = xlrd_number(xlrd_value(values[positions[-1]]))
+                if np.isnan(count) or int(count) <= 0:
+                    continue
+                for (_, name), position in zip(headers, positions):
+                    data[name].append(xlrd_value(values[position]))
+                data['count'][-1] = int(count)
+    finally:
+        book.release_resources()
+
+    columns = {}
+    for _, name in STRING_COLUMNS:
+        columns[name] = np.array(
+            ['' if value is None else str(value) for value in data[name]], dtype=str)
+    for _, name in NUMERIC_COLUMNS:
+        columns[name] = np.array(
+            [xlrd_number(value) for value in data[name]], dtype=np.float64)
+    return columns
+
+
+def sync_parse_xls_columns(
+    content: bytes, xls_date: date, reader: Optional[str] = None
+) -> Dict[str, np.ndarray]:
+    """Парсит XLS-файл в столбцы numpy для передачи из пула процессов.
+
+    Строковые столбцы передаются массивами фиксированной ширины, числовые -
+    массивами float64 с NaN на месте пропусков, поэтому результат
+    сериализуется несколькими буферами, а не тысячами объектов Python.
+    Способ чтения задается reader или XLS_READER: xlrd или pandas.
+    """
+
+    if (reader or settings.XLS_READER) == 'xlrd':
+        return read_trading_columns(content)
+
+    table = read_trading_table(content, xls_date)
+    if table.empty:
+        table = pd.DataFrame(
+            columns=[header for header, _ in STRING_COLUMNS + NUMERIC_COLUMNS])
+
+    columns = {}
+    for header, name in STRING_COLUMNS:
+        values = table[header]
+        columns[name] = values.where(values.notnull(), '').astype(str).to_numpy(dtype=str)
+    for header, name in NUMERIC_COLUMNS:
+        values = pd.to_numeric(table[header], errors='coerce')
+        columns[name] = values.to_numpy(dtype=np.float64)
+    return columns
+
+
+def get_parse_pool() -> AioPool:
+    """Возвращает общий пул процессов для разбора XLS-файлов.
+
+    Пул создается при первом обращении и живет до close_parse_pool, его
+    размер задается PARSE_WORKERS или равен числу ядер.
+    """
+
+    global _parse_pool
+    if _parse_pool is None:
+        _parse_pool = AioPool(
+            processes=settings.PARSE_WORKERS or multiprocessing.cpu_count())
+    return _parse_pool
+
+
+def close_parse_pool() -> None:
+    """Останавливает общий пул процессов разбора XLS-файлов."""
+
+    global _parse_pool
+    if _parse_pool is not None:
+        _parse_pool.close()
+        _parse_pool.join()
+        _parse_pool = None
+
+
+async def download_and_parse_xls(
+    session: HttpClient, pool: AioPool, xls_link: str, xls_date: date,
+    cache: Optional[XlsCache] = None,
+    limiter: Optional[AdaptiveLimiter] = None
+) -> Optional[List[TradingRow]]:
+    """Загружает XLS-файл бюллетеня и разбирает его в пуле процессов.
+
+    Возвращает None, если бюллетень не удалось загрузить или разобрать, и
+    пустой список для бюллетеня без сделок. Время загрузки, разбора и
+    проверки учитывается в метриках по стадиям. limiter удерживается только
+    на время загрузки: ожидание в очереди пула разбора не должно снижать
+    число одновременных загрузок.
+    """
+
+    try:
+        async with limiter or nullcontext():
+            with PIPELINE_STAGE_SECONDS.labels(stage='xls_download').time():
+                if cache is not None:
+                    content = await cache.fetch(session, xls_link, xls_date)
+                    if content is None:
+                        return None
+                else:
+                    response = await session.fetch(xls_link)
+                    if response.status != 200:
+                        logger.warning(f'Не удалось загрузить {xls_link}')
+                        return None
+
+                    content = response.body
+
+        with queued('parse_pool'), PIPELINE_STAGE_SECONDS.labels(stage='xls_parse').time():
+            columns = await pool.coro_apply(
+                sync_parse_xls_columns, args=(content, xls_date))
+        with PIPELINE_STAGE_SECONDS.labels(stage='validate').time():
+            parsed = list(validate_trading_columns(columns, xls_date))
+        PIPELINE_ROWS.labels(stage='parsed').inc(len(parsed))
+        if not parsed:
+            return []
+
+        logger.info(
+            f'Файл бюллетеня от {xls_date} обработан. '
+            f'Найдено записей: {len(parsed)}.'
+        )
+        return parsed
+
+    except Exception as e:
+        logger.error(f'Ошибка при обработке {xls_link}: {e}')
+        return None
+
+
+@timed_step('extract_data_from_xls')
+async def extract_data_from_xls(
+    all_xls_links: List[Tuple[str, date]], cache: Optional[XlsCache] = None,
+    http: Optional[HttpClient] = None,
+    failed_dates: Optional[Set[date]] = None
+) -> List[TradingRow]:
+    """Асинхронно извлекает данные из XLS-файлов по ссылкам.
+
+    Даты бюллетеней, которые не удалось загрузить или разобрать, добавляются
+    в failed_dates, чтобы отметка загрузки не перешла через них.
+    """
+
+    results: List[TradingRow] = []
+    limiter = AdaptiveLimiter(
+        DOWNLOAD_WORKERS, max_limit=MAX_DOWNLOAD_WORKERS, name='downloads')
+    pool = get_parse_pool()
+
+    async with open_client(http) as session:
+        async def fetch_and_parse(xls_link: str, xls_date: date):
+            data = await download_and_parse_xls(
+                session, pool, xls_link, xls_date, cache, limiter)
+            if data is None:
+                if failed_dates is not None:
+                    failed_dates.add(xls_date)
+                return []
+            return data
+
+        tasks = [
+            asyncio.create_task(fetch_and_parse(link, xls_date))
+            for link, xls_date in all_xls_links
         ]
+
+        for task in tqdm_asyncio.as_completed(
+            tasks, total=len(tasks), desc='Обработка XLS', unit='файл'
+        ):
+            data = await task
+            results.extend(data)
+
+    logger.info(
+        f'Всего записей: {len(results)}. '
+        f'Лимит параллельных загрузок: {limiter.limit}.'
+    )
+    return results
+
+
+def unique_records(
+    records: List[Union[TradingRow, SpimexTradingResultSchema]]
+) -> List[TradingRow]:
+    """Оставляет последнюю запись для каждой пары (дата, код инструмента).
+
+    Записи SpimexTradingResultSchema приводятся к TradingRow.
+    """
+
+    return list({
+        (record.date, record.exchange_product_id): (
+            record if isinstance(record, TradingRow) else record.to_row())
+        for record in records
+    }.values())
+
+
+async def dimension_keys(
+    session_fabric: async_sessionmaker[AsyncSession], model,
+    code_column: str, name_column: str, pairs: Set[Tuple[str, str]]
+) -> Dict[Tuple[str, str], int]:
+    """Возвращает ключи справочника для пар (код, наименование).
+
+    Недостающие пары добавляются в справочник отдельной транзакцией до
+    записи батча. Известные ключи кэшируются в процессе для каждой фабрики
+    сессий, поэтому к базе обращаются только при появлении новых
+    инструментов или базисов.
+    """
+
+    keys = _dimension_keys.setdefault(session_fabric, {}).setdefault(model, {})
+    missing = pairs - keys.keys()
+    if not missing:
+        return keys
+
+    code, name = getattr(model, code_column), getattr(model, name_column)
+    async with session_fabric() as session:
+        if session.get_bind().dialect.name == 'postgresql':
+            stmt = postgresql_insert(model)
+        else:
+            stmt = sqlite_insert(model)
+        await session.execute(stmt.values([
+            {code_column: code_value, name_column: name_value}
+            for code_value, name_value in sorted(missing)
+        ]).on_conflict_do_nothing())
+        result = await session.execute(
+            select(code, name, model.id).where(tuple_(code, name).in_(missing)))
+        await session.commit()
+
+    keys.update({(code_value, name_value): key for code_value, name_value, key in result})
+    return keys
+
+
+async def fact_rows(
+    session_fabric: async_sessionmaker[AsyncSession], rows: List[TradingRow]
+) -> List[tuple]:
+    """Заменяет наименования в записях ключами справочников.
+
+    Возвращает кортежи в порядке столбцов FACT_COLUMNS.
+    """
+
+    products = await dimension_keys(
+        session_fabric, Product, 'exchange_product_id', 'exchange_product_name',
+        {(row.exchange_product_id, row.exchange_product_name) for row in rows})
+    bases = await dimension_keys(
+        session_fabric, DeliveryBasis, 'delivery_basis_id', 'delivery_basis_name',
+        {(row.delivery_basis_id, row.delivery_basis_name) for row in rows})
+
+    return [
+        (
+            row.exchange_product_id,
+            products[row.exchange_product_id, row.exchange_product_name],
+            row.oil_id,
+            row.delivery_basis_id,
+            bases[row.delivery_basis_id, row.delivery_basis_name],
+            row.delivery_type_id,
+            row.volume,
+            row.total,
+            row.count,
+            row.date,
+        )
+        for row in rows
     ]
-    return df_filtered.to_dict(orient='records')
 
 
-async def extract_data_from_xls(
-    all_xls_links: List[Tuple[str, date]]
-) -> List[SpimexTradingResultSchema]:
-    """Асинхронно извлекает данные из XLS-файлов по ссылкам."""
+def upsert_statement(session: AsyncSession, values: List[dict]):
+    """Строит INSERT ... ON CONFLICT по естественному ключу записи."""
 
-    results: List[SpimexTradingResultSchema] = []
-    adapter = TypeAdapter(list[SpimexTradingResultSchema])
-    semaphore = asyncio.Semaphore(100)
+    if session.get_bind().dialect.name == 'postgresql':
+        stmt = postgresql_insert(SpimexTradingResult).values(values)
+    else:
+        stmt = sqlite_insert(SpimexTradingResult).values(values)
 
-    async with aiohttp.ClientSession() as session:
-        pool = AioPool(processes=min(4, multiprocessing.cpu_count()))
-        try:
-            async def fetch_and_parse(xls_link: str, xls_date: date):
-                async with semaphore:
-                    try:
-                        async with session.get(xls_link) as response:
-                            if response.status != 200:
-                                logger.warning(
-                                    f'Не удалось загрузить {xls_link}')
-                                return []
-
-                            content = await response.read()
-
-                            raw_data = await pool.coro_apply(
-                                sync_parse_xls, args=(content, xls_date))
-                            if not raw_data:
-                                return []
-
-                            parsed = adapter.validate_python(raw_data)
-                            logger.info(
-                                f'Файл бюллетеня от {xls_date} обработан. '
-                                f'Найдено записей: {len(parsed)}.'
-                            )
-                            return parsed
-
-                    except Exception as e:
-                        logger.error(f'Ошибка при обработке {xls_link}: {e}')
-                        return []
-
-            tasks = [
-                asyncio.create_task(fetch_and_parse(link, xls_date))
-                for link, xls_date in all_xls_links
-            ]
+    return stmt.on_conflict_do_update(
+        index_elements=NATURAL_KEY,
+        set_={column: stmt.excluded[column] for column in UPSERT_COLUMNS},
+    )
 
-            for task in tqdm_asyncio.as_completed(
-                tasks, total=len(tasks), desc='Обработка XLS', unit='файл'
-            ):
-                data = await task
-                results.extend(data)
 
-        finally:
-            pool.close()
-            pool.join()
+async def lock_trading_dates(session: AsyncSession, dates: Set[date]) -> None:
+    """Берет транзакционные блокировки PostgreSQL на даты торгов.
+
+    Батчи одной даты сохраняются последовательно, поэтому пересчет сводки
+    по дню видит записи всех ранее зафиксированных батчей.
+    """
+
+    if session.get_bind().dialect.name != 'postgresql':
+        return
+
+    for trading_date in sorted(dates):
+        await session.execute(select(func.pg_advisory_xact_lock(
+            TRADING_DATES_LOCK, trading_date.toordinal())))
+
+
+async def refresh_trading_days(session: AsyncSession, dates: Set[date]) -> None:
+    """Пересчитывает сводку trading_days для указанных дат."""
+
+    await session.execute(
+        delete(TradingDay).where(TradingDay.date.in_(dates)))
+    await session.execute(insert(TradingDay).from_select(
+        ['date', 'row_count', 'total_volume', 'total_value'],
+        select(
+            SpimexTradingResult.date,
+            func.count(),
+            func.sum(SpimexTradingResult.volume),
+            func.sum(SpimexTradingResult.total),
+        )
+        .where(SpimexTradingResult.date.in_(dates))
+        .group_by(SpimexTradingResult.date)
+    ))
 
-    logger.info(f'Всего записей: {len(results)}')
-    return results
+
+async def refresh_daily_rollups(session: AsyncSession, dates: Set[date]) -> None:
+    """Пересчитывает итоги trading_daily_rollups для указанных дат."""
+
+    dimensions = [
+        SpimexTradingResult.date,
+        SpimexTradingResult.oil_id,
+        SpimexTradingResult.delivery_basis_id,
+        SpimexTradingResult.delivery_type_id,
+    ]
+    await session.execute(
+        delete(TradingDailyRollup).where(TradingDailyRollup.date.in_(dates)))
+    await session.execute(insert(TradingDailyRollup).from_select(
+        [column.key for column in dimensions] + ['row_count', 'volume', 'total', 'count'],
+        select(
+            *dimensions,
+            func.count(),
+            func.sum(SpimexTradingResult.volume),
+            func.sum(SpimexTradingResult.total),
+            func.sum(SpimexTradingResult.count),
+        )
+        .where(SpimexTradingResult.date.in_(dates))
+        .group_by(*dimensions)
+    ))
 
 
 async def save_batch(
-    batch: List[SpimexTradingResultSchema], semaphore: asyncio.Semaphore,
+    batch: List[TradingRow], semaphore: AdaptiveLimiter,
     session_fabric: async_sessionmaker[AsyncSession] = async_session
 ) -> int:
-    """Сохраняет батч данных в базу данных асинхронно."""
+    """Сохраняет батч данных в базу данных асинхронно.
+
+    Записи с уже существующей парой (дата, код инструмента) обновляются,
+    поэтому повторная загрузка периода безопасна. Наименования заменяются
+    ключами справочников products и delivery_bases. Сводки trading_days и
+    trading_daily_rollups по датам батча пересчитываются в той же транзакции.
+    """
 
     async with semaphore:
         async with session_fabric() as session:
-            try:
-                values = [
-                    record.model_dump(exclude={'created_on', 'updated_on'})
-                    for record in batch
-                ]
-                stmt = insert(SpimexTradingResult).values(values)
-                await session.execute(stmt)
-                await session.commit()
-                return len(values)
+            with PIPELINE_STAGE_SECONDS.labels(stage='save').time():
+                try:
+                    values = [
+                        dict(zip(FACT_COLUMNS, row))
+                        for row in await fact_rows(session_fabric, unique_records(batch))
+                    ]
+                    dates = {value['date'] for value in values}
+                    await ensure_partitions(session, dates)
+                    await lock_trading_dates(session, dates)
+                    await session.execute(upsert_statement(session, values))
+                    await refresh_trading_days(session, dates)
+                    await refresh_daily_rollups(session, dates)
+                    await session.commit()
+                    PIPELINE_ROWS.labels(stage='saved').inc(len(values))
+                    return len(values)
+
+                except Exception as e:
+                    await session.rollback()
+                    report_overload()
+                    PIPELINE_FAILED_BATCHES.inc()
+                    logger.error(f'Ошибка при сохранении батча: {e}')
+                    return 0
+
+
+async def copy_batch(
+    batch: List[TradingRow], semaphore: AdaptiveLimiter,
+    session_fabric: async_sessionmaker[AsyncSession] = async_session
+) -> int:
+    """Сохраняет батч данных через бинарный COPY PostgreSQL.
 
-            except Exception as e:
-                await session.rollback()
-                logger.error(f'Ошибка при сохранении батча: {e}')
-                return 0
+    Записи копируются во временную таблицу и переносятся в основную одним
+    INSERT ... ON CONFLICT. Для драйверов, отличных от asyncpg, используется
+    обычная вставка save_batch.
+    """
 
+    if session_fabric.kw['bind'].dialect.driver != 'asyncpg':
+        return await save_batch(batch, semaphore, session_fabric=session_fabric)
 
-async def save_data_to_db_async(
-    results: List[SpimexTradingResultSchema], session_fabric: async_sessionmaker[AsyncSession] = async_session,
-    batch_size: int = 1000
+    now = datetime.now().replace(microsecond=0)
+
+    async with semaphore:
+        async with session_fabric() as session:
+            with PIPELINE_STAGE_SECONDS.labels(stage='save').time():
+                try:
+                    rows = [
+                        (*row, now, now)
+                        for row in await fact_rows(session_fabric, unique_records(batch))
+                    ]
+                    dates = {record.date for record in batch}
+                    await ensure_partitions(session, dates)
+                    await lock_trading_dates(session, dates)
+                    await session.execute(text(COPY_STAGE_SQL))
+                    connection = await session.connection()
+                    raw_connection = await connection.get_raw_connection()
+                    await raw_connection.driver_connection.copy_records_to_table(
+                        COPY_STAGE_TABLE, records=rows, columns=COPY_COLUMNS)
+                    await session.execute(text(COPY_MERGE_SQL))
+                    await refresh_trading_days(session, dates)
+                    await refresh_daily_rollups(session, dates)
+                    await session.commit()
+                    PIPELINE_ROWS.labels(stage='saved').inc(len(rows))
+                    return len(rows)
+
+                except Exception as e:
+                    await session.rollback()
+                    report_overload()
+                    PIPELINE_FAILED_BATCHES.inc()
+                    logger.error(f'Ошибка при сохранении батча через COPY: {e}')
+                    return 0
+
+
+async def get_high_water_mark(
+    session_fabric: async_sessionmaker[AsyncSession] = async_session
+) -> Optional[date]:
+    """Возвращает последнюю загруженную дату торгов."""
+
+    async with session_fabric() as session:
+        state = await session.get(IngestState, INGEST_STATE_NAME)
+        if state is not None:
+            return state.last_date
+
+        return (await session.execute(
+            select(func.max(SpimexTradingResult.date))
+        )).scalar()
+
+
+async def advance_high_water_mark(
+    saved_dates: Set[date], failed_dates: Set[date],
+    session_fabric: async_sessionmaker[AsyncSession] = async_session
 ) -> None:
-    """Асинхронно сохраняет данные в базу данных."""
+    """Сдвигает отметку загрузки на последнюю дату без ошибок сохранения.
+
+    Отметка не переходит через дату, батч которой не удалось сохранить,
+    чтобы следующая инкрементальная загрузка повторила ее.
+    """
+
+    candidates = [
+        saved_date for saved_date in saved_dates
+        if not any(failed <= saved_date for failed in failed_dates)
+    ]
+    if not candidates:
+        return
 
     async with session_fabric() as session:
         try:
+            state = await session.get(
+                IngestState, INGEST_STATE_NAME, with_for_update=True)
+            if state is None:
+                session.add(IngestState(
+                    name=INGEST_STATE_NAME, last_date=max(candidates)))
+            elif state.last_date < max(candidates):
+                state.last_date = max(candidates)
             await session.commit()
 
-            existing_dates = {
-                row[0] for row in (
-                    await session.execute(select(SpimexTradingResult.date))
-                ).all()
-            }
         except Exception as e:
-            logger.error(f'Ошибка при проверке существующих дат: {e}')
-            return
+            await session.rollback()
+            logger.error(f'Ошибка при обновлении отметки загрузки: {e}')
 
-    new_records = [
-        record for record in results if record.date not in existing_dates
-    ]
+
+@timed_step('save_data_to_db_async')
+async def save_data_to_db_async(
+    results: List[TradingRow], session_fabric: async_sessionmaker[AsyncSession] = async_session,
+    batch_size: int = 1000,
+    saver: Callable[..., Awaitable[int]] = save_batch,
+    failed_dates: Optional[Set[date]] = None
+) -> int:
+    """Асинхронно сохраняет данные в базу данных.
+
+    failed_dates - даты бюллетеней, не загруженных на предыдущих шагах:
+    отметка загрузки не переходит через них так же, как через даты батчей с
+    ошибкой сохранения.
+    """
+
+    new_records = unique_records(results)
 
     batches = [
         new_records[i:i + batch_size]
         for i in range(0, len(new_records), batch_size)
     ]
 
-    semaphore = asyncio.Semaphore(10)
+    limiter = AdaptiveLimiter(DB_WORKERS, max_limit=MAX_DB_WORKERS, name='db')
 
     tasks = await asyncio.gather(*[
-        save_batch(batch, semaphore, session_fabric=session_fabric) for batch in batches
+        saver(batch, limiter, session_fabric=session_fabric) for batch in batches
     ])
 
+    saved_dates: Set[date] = set()
+    failed_dates = set(failed_dates or ())
+    for batch, saved in zip(batches, tasks):
+        (saved_dates if saved else failed_dates).update(
+            record.date for record in batch)
+    await advance_high_water_mark(saved_dates, failed_dates, session_fabric)
+    await publish_ingested_dates(saved_dates)
+
     total_saved = sum(tasks)
     if total_saved:
         logger.info(f'Добавлено новых записей: {total_saved}')
     else:
         logger.info('Нет новых записей для добавления.')
+    return total_saved
+
+
+@timed_step('run_streaming_pipeline')
+async def run_streaming_pipeline(
+    cutoff_start_date: date, cutoff_end_date: date,
+    session_fabric: async_sessionmaker[AsyncSession] = async_session,
+    batch_size: int = 1000, queue_size: int = 100,
+    download_workers: int = MAX_DOWNLOAD_WORKERS, db_workers: int = MAX_DB_WORKERS,
+    cache: Optional[XlsCache] = None,
+    saver: Callable[..., Awaitable[int]] = save_batch,
+    http: Optional[HttpClient] = None
+) -> int:
+    """Потоково загружает, разбирает и сохраняет бюллетени за период.
+
+    Стадии связаны ограниченными очередями: ссылки со страниц сразу уходят
+    на загрузку, разобранные записи копятся до размера батча и пишутся в
+    базу, пока продолжаются загрузка и разбор. В памяти одновременно
+    находится не больше queue_size элементов каждой очереди. Число
+    одновременных загрузок и сохранений подбирается адаптивными лимитерами,
+    download_workers и db_workers задают только их верхнюю границу.
+    """
+
+    links_queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+    records_queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+    page_limiter = AdaptiveLimiter(
+        PAGE_WORKERS, max_limit=settings.HTTP_LIMIT_PER_HOST, name='pages')
+    download_limiter = AdaptiveLimiter(
+        min(DOWNLOAD_WORKERS, download_workers), max_limit=download_workers,
+        name='downloads')
+    db_limiter = AdaptiveLimiter(
+        min(DB_WORKERS, db_workers), max_limit=db_workers, name='db')
+    stop_event = asyncio.Event()
+    saved_dates: Set[date] = set()
+    failed_dates: Set[date] = set()
+
+    logger.info(
+        f'Потоковая загрузка за период с {cutoff_start_date} '
+        f'по {cutoff_end_date}.'
+    )
+
+    async def produce_links(session: HttpClient) -> None:
+        if cache is not None and cache.offline:
+            for link in cache.links(cutoff_start_date, cutoff_end_date):
+                await links_queue.put(link)
+                set_queue_depth('links', links_queue.qsize())
+            return
+
+        pages = ListingPages(session)
+        last_page_number = await get_last_page_number(session, pages)
+        start_page, end_page = await find_page_bounds_binary(
+            session, last_page_number, cutoff_start_date, cutoff_end_date,
+            pages=pages)
+        logger.info(f'Обрабатываем страницы с {start_page} по {end_page}.')
+
+        async def fetch(page_number: int) -> None:
+            if stop_event.is_set():
+                return
+
+            url = ListingPages.url(page_number)
+            async with page_limiter:
+                xls_links, stop_flag = await get_xls_links_from_page(
+                    session, url, cutoff_start_date, cutoff_end_date,
+                    page_number, pages=pages)
+
+            if stop_flag:
+                stop_event.set()
+
+            for link in xls_links:
+                await links_queue.put(link)
+                set_queue_depth('links', links_queue.qsize())
+
+        await asyncio.gather(*[
+            fetch(page) for page in range(start_page, end_page + 1)
+        ])
+
+    async def parse_links(session: HttpClient, pool: AioPool) -> None:
+        while (link := await links_queue.get()) is not None:
+            set_queue_depth('links', links_queue.qsize())
+            xls_link, xls_date = link
+            records = await download_and_parse_xls(
+                session, pool, xls_link, xls_date, cache, download_limiter)
+            if records is None:
+                failed_dates.add(xls_date)
+            elif records:
+                await records_queue.put(records)
+                set_queue_depth('records', records_queue.qsize())
+
+    async def save_and_track(records: List[TradingRow]) -> int:
+        saved = await saver(
+            records, db_limiter, session_fabric=session_fabric)
+        (saved_dates if saved else failed_dates).update(
+            record.date for record in records)
+        return saved
+
+    async def save_records() -> int:
+        total_saved = 0
+        pending: Set[asyncio.Task] = set()
+        batch: List[TradingRow] = []
+
+        async def flush(records: List[TradingRow]) -> None:
+            nonlocal pending, total_saved
+            if len(pending) >= db_workers:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED)
+                total_saved += sum(task.result() for task in done)
+            pending.add(asyncio.create_task(save_and_track(records)))
+
+        while (records := await records_queue.get()) is not None:
+            set_queue_depth('records', records_queue.qsize())
+            batch.extend(records)
+            while len(batch) >= batch_size:
+                await flush(batch[:batch_size])
+                batch = batch[batch_size:]
+
+        if batch:
+            await flush(batch)
+        if pending:
+            total_saved += sum(await asyncio.gather(*pending))
+        return total_saved
+
+    async with open_client(http) as session:
+        pool = get_parse_pool()
+        saving = asyncio.create_task(save_records())
+        try:
+            parsers = [
+                asyncio.create_task(parse_links(session, pool))
+                for _ in range(download_workers)
+            ]
+            try:
+                await produce_links(session)
+            finally:
+                for _ in parsers:
+                    await links_queue.put(None)
+                await asyncio.gather(*parsers)
+        finally:
+            await records_queue.put(None)
+            total_saved = await saving
+
+    await advance_high_water_mark(saved_dates, failed_dates, session_fabric)
+    await publish_ingested_dates(saved_dates)
+
+    if total_saved:
+        logger.info(f'Добавлено новых записей: {total_saved}')
+    else:
+        logger.info('Нет новых записей для добавления.')
+    return total_saved
+
+
+async def collect_links_since(
+    session: HttpClient, last_date: date
+) -> List[Tuple[str, date]]:
+    """Собирает ссылки на бюллетени новее last_date, начиная с первой страницы.
+
+    Обход останавливается на первой странице, где встречается бюллетень не
+    новее отметки, поэтому при ежедневном запуске нужны одна-две страницы.
+    Ошибка загрузки страницы пробрасывается: бюллетени с нее неизвестны, и
+    отметка не должна перейти через них.
+    """
+
+    cutoff_start_date = last_date + timedelta(days=1)
+    cutoff_end_date = datetime.now().date()
+    all_links: List[Tuple[str, date]] = []
+    page_number = 1
+
+    while True:
+        url = ListingPages.url(page_number)
+        xls_links, stop_flag = await get_xls_links_from_page(
+            session, url, cutoff_start_date, cutoff_end_date, page_number,
+            raise_errors=True)
+        all_links.extend(xls_links)
+        if stop_flag or not xls_links:
+            break
+        page_number += 1
+
+    return list(reversed(all_links))
+
+
+async def sync_new_results(
+    session_fabric: async_sessionmaker[AsyncSession] = async_session,
+    cache: Optional[XlsCache] = None,
+    saver: Callable[..., Awaitable[int]] = save_batch,
+    http: Optional[HttpClient] = None
+) -> int:
+    """Загружает бюллетени, вышедшие после последней загруженной даты."""
+
+    last_date = await get_high_water_mark(session_fabric)
+    if last_date is None:
+        logger.error(
+            'База пуста: выполните первичную загрузку за период, '
+            'затем используйте инкрементальную.'
+        )
+        return 0
+
+    logger.info(f'Инкрементальная загрузка бюллетеней после {last_date}.')
+
+    async with open_client(http) as session:
+        try:
+            links = await collect_links_since(session, last_date)
+        except Exception as e:
+            logger.error(
+                f'Не удалось получить список бюллетеней, загрузка прервана, '
+                f'отметка остается на {last_date}: {e}'
+            )
+            return 0
+
+        if not links:
+            logger.info('Новых бюллетеней нет.')
+            return 0
+
+        failed_dates: Set[date] = set()
+        results = await extract_data_from_xls(
+            links, cache=cache, http=session, failed_dates=failed_dates)
+    return await save_data_to_db_async(
+        results, session_fabric=session_fabric, saver=saver,
+        failed_dates=failed_dates)
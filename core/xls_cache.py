@@ -0,0 +1,232 @@
+import hashlib
+import json
+import os
+import time
+from datetime import date
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import aiofiles
+
+from core.http_client import RETRY_EXCEPTIONS, HttpClient
+from core.logger_setup import setup_logger
+
+INDEX_FILE = 'index.json'
+OBJECTS_DIR = 'objects'
+INDEX_SAVE_INTERVAL = 20
+ORPHAN_GRACE_SECONDS = 3600
+
+logger = setup_logger()
+
+
+class XlsCache:
+    """Локальный кэш XLS-файлов бюллетеней с адресацией по содержимому.
+
+    Файлы хранятся в каталоге objects под именем sha256 содержимого, а индекс
+    сопоставляет ключ (URL без параметров запроса и дата бюллетеня) с хэшем,
+    ETag и Last-Modified ответа. При превышении max_bytes удаляются записи,
+    к которым дольше всего не обращались. В режиме offline сеть не
+    используется, а список бюллетеней берется из индекса.
+
+    Индекс сохраняется каждые INDEX_SAVE_INTERVAL новых файлов, после
+    вытеснения и при выходе из контекста. Файлы, не попавшие в индекс из-за
+    аварийного завершения, удаляются при следующем открытии кэша.
+    """
+
+    def __init__(
+        self, directory: str, max_bytes: int, offline: bool = False
+    ) -> None:
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.offline = offline
+        self.index: Dict[str, dict] = {}
+        self._unsaved = 0
+        self._load_index()
+        self.collect_garbage()
+
+    def __enter__(self) -> 'XlsCache':
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.save_index()
+
+    @staticmethod
+    def make_key(url: str, xls_date: date) -> str:
+        """Формирует ключ кэша по URL бюллетеня и его дате."""
+
+        parts = urlsplit(url)
+        return f'{xls_date.isoformat()}|{parts.netloc}{parts.path}'
+
+    @property
+    def size(self) -> int:
+        """Суммарный размер файлов, на которые ссылается индекс."""
+
+        blobs = {entry['sha256']: entry['size'] for entry in self.index.values()}
+        return sum(blobs.values())
+
+    def links(
+        self, cutoff_start_date: date, cutoff_end_date: date
+    ) -> List[Tuple[str, date]]:
+        """Возвращает закэшированные ссылки на бюллетени за период."""
+
+        links = []
+        for entry in self.index.values():
+            xls_date = date.fromisoformat(entry['date'])
+            if cutoff_start_date <= xls_date <= cutoff_end_date:
+                links.append((entry['url'], xls_date))
+        return sorted(links, key=lambda link: link[1])
+
+    async def get(self, url: str, xls_date: date) -> Optional[bytes]:
+        """Возвращает содержимое файла из кэша или None."""
+
+        entry = self.index.get(self.make_key(url, xls_date))
+        if entry is None:
+            return None
+
+        try:
+            async with aiofiles.open(self._blob_path(entry['sha256']), 'rb') as file:
+                content = await file.read()
+        except FileNotFoundError:
+            del self.index[self.make_key(url, xls_date)]
+            return None
+
+        entry['accessed'] = time.time()
+        return content
+
+    async def put(
+        self, url: str, xls_date: date, content: bytes,
+        etag: Optional[str] = None, last_modified: Optional[str] = None
+    ) -> None:
+        """Сохраняет файл в кэш и при необходимости вытесняет старые записи."""
+
+        sha256 = hashlib.sha256(content).hexdigest()
+        blob_path = self._blob_path(sha256)
+        if not blob_path.exists():
+            blob_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = blob_path.with_suffix('.tmp')
+            async with aiofiles.open(tmp_path, 'wb') as file:
+                await file.write(content)
+            os.replace(tmp_path, blob_path)
+
+        self.index[self.make_key(url, xls_date)] = {
+            'url': url,
+            'date': xls_date.isoformat(),
+            'sha256': sha256,
+            'size': len(content),
+            'etag': etag,
+            'last_modified': last_modified,
+            'accessed': time.time(),
+        }
+        self._unsaved += 1
+        if self.evict() or self._unsaved >= INDEX_SAVE_INTERVAL:
+            self.save_index()
+
+    async def fetch(
+        self, session: HttpClient, url: str, xls_date: date
+    ) -> Optional[bytes]:
+        """Возвращает файл бюллетеня, обращаясь к сети только при необходимости.
+
+        Для закэшированного файла выполняется условный запрос: при ответе 304,
+        ошибке сервера или недоступности сети используется локальная копия.
+        """
+
+        entry = self.index.get(self.make_key(url, xls_date))
+        if self.offline:
+            content = await self.get(url, xls_date)
+            if content is None:
+                logger.warning(f'Файл {url} отсутствует в локальном кэше')
+            return content
+
+        headers = {}
+        if entry is not None:
+            if entry['etag']:
+                headers['If-None-Match'] = entry['etag']
+            if entry['last_modified']:
+                headers['If-Modified-Since'] = entry['last_modified']
+
+        try:
+            response = await session.fetch(url, headers=headers)
+        except RETRY_EXCEPTIONS as e:
+            if entry is None:
+                raise
+            logger.warning(f'Не удалось загрузить {url}, используется кэш: {e}')
+        else:
+            if response.status == 200:
+                await self.put(
+                    url, xls_date, response.body,
+                    etag=response.headers.get('ETag'),
+                    last_modified=response.headers.get('Last-Modified'),
+                )
+                return response.body
+
+            if response.status != 304:
+                logger.warning(
+                    f'Не удалось загрузить {url}: статус {response.status}')
+
+        return await self.get(url, xls_date)
+
+    def evict(self) -> int:
+        """Удаляет давно не использованные записи сверх лимита размера.
+
+        Возвращает число удаленных записей индекса.
+        """
+
+        total = self.size
+        evicted = 0
+        entries = sorted(self.index.items(), key=lambda item: item[1]['accessed'])
+        for key, entry in entries:
+            if total <= self.max_bytes:
+                break
+
+            del self.index[key]
+            evicted += 1
+            if any(e['sha256'] == entry['sha256'] for e in self.index.values()):
+                continue
+
+            self._blob_path(entry['sha256']).unlink(missing_ok=True)
+            total -= entry['size']
+        return evicted
+
+    def collect_garbage(self) -> int:
+        """Удаляет файлы, на которые не ссылается индекс.
+
+        Такие файлы остаются, если процесс был остановлен до сохранения
+        индекса. Файлы моложе ORPHAN_GRACE_SECONDS не трогаются, так как их
+        может записывать другой процесс с тем же каталогом кэша.
+        """
+
+        objects_dir = self.directory / OBJECTS_DIR
+        if not objects_dir.exists():
+            return 0
+
+        referenced = {entry['sha256'] for entry in self.index.values()}
+        deadline = time.time() - ORPHAN_GRACE_SECONDS
+        removed = 0
+        for path in objects_dir.glob('*/*'):
+            if path.name in referenced or path.stat().st_mtime > deadline:
+                continue
+            path.unlink(missing_ok=True)
+            removed += 1
+
+        if removed:
+            logger.info(f'Удалено файлов кэша без записи в индексе: {removed}')
+        return removed
+
+    def save_index(self) -> None:
+        """Атомарно записывает индекс кэша на диск."""
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        index_path = self.directory / INDEX_FILE
+        tmp_path = index_path.with_suffix('.tmp')
+        tmp_path.write_text(json.dumps(self.index), encoding='utf-8')
+        os.replace(tmp_path, index_path)
+        self._unsaved = 0
+
+    def _load_index(self) -> None:
+        index_path = self.directory / INDEX_FILE
+        if index_path.exists():
+            self.index = json.loads(index_path.read_text(encoding='utf-8'))
+
+    def _blob_path(self, sha256: str) -> Path:
+        return self.directory / OBJECTS_DIR / sha256[:2] / sha256
@@ -1,16 +1,73 @@
+import argparse
 import asyncio
+from typing import Optional
+
+from core.config import settings
 from core.database import engine
-from core.utils import extract_data_from_xls, input_dates, parse_all_pages, \
-                       save_data_to_db_async
+from core.http_client import HttpClient
+from core.metrics import report_run
+from core.utils import close_parse_pool, copy_batch, extract_data_from_xls, \
+                       input_dates, parse_all_pages, run_streaming_pipeline, \
+                       save_batch, save_data_to_db_async, sync_new_results
+from core.xls_cache import XlsCache
 
 
-async def main():
-    start_date, end_date = input_dates()
-    links = await parse_all_pages(start_date, end_date)
-    results = await extract_data_from_xls(links)
-    await save_data_to_db_async(results)
-    await engine.dispose()
+async def main(
+    stream: bool = False, offline: bool = False, sync: bool = False,
+    copy: bool = False, metrics: Optional[str] = None
+):
+    saver = copy_batch if copy else save_batch
+    try:
+        with XlsCache(
+            settings.XLS_CACHE_DIR, settings.XLS_CACHE_MAX_BYTES, offline=offline
+        ) as cache:
+            async with HttpClient() as http:
+                if sync:
+                    await sync_new_results(cache=cache, saver=saver, http=http)
+                else:
+                    start_date, end_date = input_dates()
+                    if stream:
+                        await run_streaming_pipeline(
+                            start_date, end_date, cache=cache, saver=saver,
+                            http=http)
+                    else:
+                        if offline:
+                            links = cache.links(start_date, end_date)
+                        else:
+                            links = await parse_all_pages(
+                                start_date, end_date, http=http)
+                        failed_dates = set()
+                        results = await extract_data_from_xls(
+                            links, cache=cache, http=http,
+                            failed_dates=failed_dates)
+                        await save_data_to_db_async(
+                            results, saver=saver, failed_dates=failed_dates)
+    finally:
+        close_parse_pool()
+        await engine.dispose()
+    report_run(metrics)
 
 
 if __name__ == '__main__':
-    asyncio.run(main())
+    parser = argparse.ArgumentParser(
+        description='Загрузка результатов торгов СПИМЭКС в базу данных.')
+    parser.add_argument(
+        '--stream', action='store_true',
+        help='потоковый режим: загрузка, разбор и сохранение параллельно')
+    parser.add_argument(
+        '--offline', action='store_true',
+        help='использовать только локальный кэш XLS-файлов, без сети')
+    parser.add_argument(
+        '--sync', action='store_true',
+        help='без ввода дат загрузить бюллетени после последней загруженной даты')
+    parser.add_argument(
+        '--copy', action='store_true',
+        help='сохранять данные через COPY PostgreSQL вместо INSERT')
+    parser.add_argument(
+        '--metrics', metavar='PATH',
+        help='записать метрики запуска: *.prom в формате Prometheus, '
+             'иначе JSON-сводку')
+    args = parser.parse_args()
+    asyncio.run(main(
+        stream=args.stream, offline=args.offline, sync=args.sync,
+        copy=args.copy, metrics=args.metrics))
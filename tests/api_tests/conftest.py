@@ -1,37 +1,108 @@
-from datetime import date
+from datetime import date, timedelta
+from itertools import count
 
 import pytest
+import pytest_asyncio
+from sqlalchemy import text
 from sqlalchemy.ext.asyncio import (AsyncSession, async_sessionmaker,
                                     create_async_engine)
 
-from core.models import Base, SpimexTradingResult
+from core.models import Base, DeliveryBasis, Product, SpimexTradingResult
+from core.utils import refresh_daily_rollups, refresh_trading_days
 
 DATABASE_URL = 'sqlite+aiosqlite:///:memory:'
+SEED_PRODUCTS_SQL = '''
+    SELECT
+        'A' || lpad((product % 100)::text, 3, '0') AS oil_id,
+        'B' || lpad((product / 100)::text, 2, '0') AS basis_id,
+        CASE WHEN product % 2 = 0 THEN 'A' ELSE 'F' END AS type_id
+    FROM generate_series(0, 999) AS product
+'''
+SEED_TRADING_RESULTS_SQL = (
+    f'''
+    INSERT INTO products (exchange_product_id, exchange_product_name)
+    SELECT oil_id || basis_id || type_id, 'Product ' || oil_id
+    FROM ({SEED_PRODUCTS_SQL}) AS ids
+    ''',
+    f'''
+    INSERT INTO delivery_bases (delivery_basis_id, delivery_basis_name)
+    SELECT DISTINCT basis_id, 'Basis ' || basis_id
+    FROM ({SEED_PRODUCTS_SQL}) AS ids
+    ''',
+    f'''
+    INSERT INTO spimex_trading_results (
+        exchange_product_id, product_key, oil_id, delivery_basis_id,
+        delivery_basis_key, delivery_type_id, volume, total, count, date,
+        created_on, updated_on
+    )
+    SELECT
+        products.exchange_product_id, products.id, oil_id, basis_id,
+        delivery_bases.id, type_id, 100, 1000, 1, DATE '2022-01-01' + day,
+        now(), now()
+    FROM generate_series(0, 999) AS day,
+         ({SEED_PRODUCTS_SQL}) AS ids
+         JOIN products ON products.exchange_product_id = oil_id || basis_id || type_id
+         JOIN delivery_bases ON delivery_bases.delivery_basis_id = basis_id
+    ''',
+)
+SEED_TABLES = 'spimex_trading_results, trading_days, trading_daily_rollups, products, delivery_bases'
 
 
 @pytest.fixture
-async def async_session():
+async def session_fabric():
     engine = create_async_engine(DATABASE_URL, echo=False)
     async_session = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
 
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
 
-    async with async_session() as session:
-        yield session
+    yield async_session
 
     await engine.dispose()
 
 
+@pytest.fixture
+async def async_session(session_fabric):
+    async with session_fabric() as session:
+        yield session
+
+
+@pytest.fixture
+def save_objects(async_session):
+    async def _save_objects(objects):
+        async_session.add_all(objects)
+        await async_session.flush()
+        dates = {obj.date for obj in objects}
+        await refresh_trading_days(async_session, dates)
+        await refresh_daily_rollups(async_session, dates)
+        await async_session.commit()
+    return _save_objects
+
+
 @pytest.fixture
 def db_object():
+    product_numbers = count(1)
+    products, bases = {}, {}
+
     def _db_object(**kwargs):
+        exchange_product_id = kwargs.get('exchange_product_id', f'ID{next(product_numbers)}')
+        exchange_product_name = kwargs.get('exchange_product_name', 'Product A')
+        delivery_basis_id = kwargs.get('delivery_basis_id', 'DB1')
+        delivery_basis_name = kwargs.get('delivery_basis_name', 'Basis A')
+        product = products.setdefault(
+            (exchange_product_id, exchange_product_name),
+            Product(exchange_product_id=exchange_product_id, exchange_product_name=exchange_product_name),
+        )
+        basis = bases.setdefault(
+            (delivery_basis_id, delivery_basis_name),
+            DeliveryBasis(delivery_basis_id=delivery_basis_id, delivery_basis_name=delivery_basis_name),
+        )
         return SpimexTradingResult(
-            exchange_product_id=kwargs.get('exchange_product_id', 'ID1'),
-            exchange_product_name=kwargs.get('exchange_product_name', 'Product A'),
+            exchange_product_id=exchange_product_id,
+            product=product,
             oil_id=kwargs.get('oil_id', 'OIL1'),
-            delivery_basis_id=kwargs.get('delivery_basis_id', 'DB1'),
-            delivery_basis_name=kwargs.get('delivery_basis_name', 'Basis A'),
+            delivery_basis_id=delivery_basis_id,
+            delivery_basis=basis,
             delivery_type_id=kwargs.get('delivery_type_id', 'T'),
             volume=kwargs.get('volume', 100),
             total=kwargs.get('total', 1000),
@@ -39,3 +110,29 @@ def db_object():
             date=kwargs.get('date', date(2024, 6, 21)),
         )
     return _db_object
+
+
+@pytest_asyncio.fixture
+async def seeded_trading_table(async_test_session):
+
+    async with async_test_session() as session:
+        await session.execute(text(f'TRUNCATE {SEED_TABLES}'))
+        for statement in SEED_TRADING_RESULTS_SQL:
+            await session.execute(text(statement))
+        dates = {date(2022, 1, 1) + timedelta(days=day) for day in range(1000)}
+        await refresh_trading_days(session, dates)
+        await refresh_daily_rollups(session, dates)
+        await session.commit()
+    async with async_test_session() as session:
+        await session.execute(text('ANALYZE spimex_trading_results'))
+        await session.execute(text('ANALYZE trading_days'))
+        await session.execute(text('ANALYZE trading_daily_rollups'))
+        await session.execute(text('ANALYZE products'))
+        await session.execute(text('ANALYZE delivery_bases'))
+        await session.commit()
+
+    yield async_test_session
+
+    async with async_test_session() as session:
+        await session.execute(text(f'TRUNCATE {SEED_TABLES}'))
+        await session.commit()
@@ -1,21 +1,47 @@
+import asyncio
+import csv
+import io
+import json
 from datetime import date
 
+import pyarrow as pa
+import pyarrow.parquet as pq
 import pytest
+from fastapi import HTTPException
+from fastapi_cache import FastAPICache
+from fastapi_cache.backends.inmemory import InMemoryBackend
+from httpx import ASGITransport, AsyncClient
+from prometheus_client import CONTENT_TYPE_LATEST
+from prometheus_client.parser import text_string_to_metric_families
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql
 
 from api.routers import get_dynamics as cached_get_dynamics
 from api.routers import get_trading_results as cached_get_trading_results
+from api import routers
+from api.app import app
+from api.cache import (CACHE_PREFIX, LATEST_INDEX_KEY, PERIOD_INDEX_KEY, IndexedRedisBackend, LocalCache,
+                       TieredBackend, coalesce, custom_key_builder, evict_cached_dates, index_cached_keys,
+                       is_key_affected)
+from api.dependencies import get_async_session
+from api.metrics import RequestTimings, _request_timings, instrument_engine
+from api.schemas import SpimexTradingResultOut
+from api.routers import get_dynamics_page as cached_get_dynamics_page
+from api.routers import get_dynamics_aggregates as cached_get_dynamics_aggregates
+from api.routers import (aggregates_query, dynamics_page_query, dynamics_query, export_dynamics,
+                         export_dynamics_columnar, last_dates_query, latest_results_query)
 from api.routers import last_trading_dates as cached_last_trading_dates
+from core.metrics import sample_value
 
 
 @pytest.mark.asyncio
-async def test_last_trading_dates(async_session, db_object):
+async def test_last_trading_dates(async_session, db_object, save_objects):
 
-    async_session.add_all([
+    await save_objects([
         db_object(date=date(2024, 6, 20)),
         db_object(date=date(2024, 6, 19)),
         db_object(date=date(2024, 6, 18)),
     ])
-    await async_session.commit()
 
     last_trading_dates = cached_last_trading_dates.__wrapped__
 
@@ -25,11 +51,10 @@ async def test_last_trading_dates(async_session, db_object):
 
 
 @pytest.mark.asyncio
-async def test_get_dynamics(async_session, db_object):
+async def test_get_dynamics(async_session, db_object, save_objects):
 
-    async_session.add_all(
+    await save_objects(
         [db_object() for _ in range(5)] + [db_object(oil_id='OIL2'), db_object(date=date(2024, 6, 24))])
-    await async_session.commit()
 
     get_dynamics = cached_get_dynamics.__wrapped__
 
@@ -46,11 +71,117 @@ async def test_get_dynamics(async_session, db_object):
 
 
 @pytest.mark.asyncio
-async def test_get_trading_results(async_session, db_object):
+async def test_get_dynamics_page(async_session, db_object, save_objects):
 
-    async_session.add_all(
+    await save_objects(
+        [db_object(date=date(2024, 6, day)) for day in (20, 20, 20, 21, 21, 21, 21)]
+        + [db_object(oil_id='OIL2', date=date(2024, 6, 21))])
+
+    get_dynamics = cached_get_dynamics.__wrapped__
+    get_dynamics_page = cached_get_dynamics_page.__wrapped__
+    params = dict(start_date=date(2024, 6, 20), end_date=date(2024, 6, 21), oil_id='OIL1')
+
+    pages, cursor = [], None
+    while True:
+        page = await get_dynamics_page(**params, cursor=cursor, limit=3, session=async_session)
+        pages.append(page.items)
+        cursor = page.next_cursor
+        if cursor is None:
+            break
+
+    expected = await get_dynamics(**params, session=async_session)
+    assert [len(items) for items in pages] == [3, 3, 1]
+    assert [item.exchange_product_id for items in pages for item in items] == [
+        obj.exchange_product_id for obj in expected]
+
+    with pytest.raises(HTTPException):
+        await get_dynamics_page(**params, cursor='broken', limit=3, session=async_session)
+
+
+@pytest.mark.asyncio
+async def test_get_dynamics_aggregates(async_session, db_object, save_objects):
+
+    await save_objects([
+        db_object(date=date(2024, 6, 17), volume=10, total=1000),
+        db_object(date=date(2024, 6, 21), volume=30, total=2000, count=2),
+        db_object(date=date(2024, 6, 21), oil_id='OIL2', volume=5, total=500),
+        db_object(date=date(2024, 6, 24), volume=20, total=3000),
+        db_object(date=date(2024, 7, 1), volume=1, total=100),
+    ])
+
+    get_dynamics_aggregates = cached_get_dynamics_aggregates.__wrapped__
+    params = dict(
+        start_date=date(2024, 6, 1), end_date=date(2024, 6, 30),
+        oil_id=None, delivery_type_id=None, delivery_basis_id=None, session=async_session)
+
+    daily = await get_dynamics_aggregates(**params, group_by=[], bucket='day')
+    assert [(row.date, row.volume, row.count) for row in daily] == [
+        (date(2024, 6, 24), 20, 1), (date(2024, 6, 21), 35, 3), (date(2024, 6, 17), 10, 1)]
+
+    weekly = await get_dynamics_aggregates(**params, group_by=['oil_id'], bucket='week')
+    assert [(row.date, row.oil_id, row.volume, row.total) for row in weekly] == [
+        (date(2024, 6, 24), 'OIL1', 20, 3000),
+        (date(2024, 6, 17), 'OIL1', 40, 3000),
+        (date(2024, 6, 17), 'OIL2', 5, 500),
+    ]
+    assert weekly[1].avg_price == 75
+    assert weekly[1].delivery_basis_id is None
+
+    monthly = await get_dynamics_aggregates(
+        **{**params, 'oil_id': 'OIL1', 'end_date': date(2024, 7, 31)}, group_by=[], bucket='month')
+    assert [(row.date, row.volume) for row in monthly] == [(date(2024, 7, 1), 1), (date(2024, 6, 1), 60)]
+
+
+@pytest.mark.parametrize('export_format', ['ndjson', 'csv'])
+@pytest.mark.asyncio
+async def test_export_dynamics(session_fabric, async_session, db_object, save_objects, export_format):
+
+    await save_objects([db_object(date=date(2024, 6, 20)) for _ in range(3)] + [db_object(date=date(2024, 6, 24))])
+
+    response = await export_dynamics(
+        start_date=date(2024, 6, 20), end_date=date(2024, 6, 21), format=export_format,
+        session_fabric=session_fabric)
+    body = ''.join([chunk async for chunk in response.body_iterator])
+
+    if export_format == 'ndjson':
+        rows = [json.loads(line) for line in body.splitlines()]
+    else:
+        rows = list(csv.DictReader(io.StringIO(body)))
+    assert len(rows) == 3
+    assert {row['date'] for row in rows} == {'2024-06-20'}
+    assert rows[0]['exchange_product_name'] == 'Product A'
+
+
+@pytest.mark.parametrize('export_format', ['arrow', 'parquet'])
+@pytest.mark.asyncio
+async def test_export_dynamics_columnar(session_fabric, db_object, save_objects, export_format):
+
+    await save_objects([db_object(date=date(2024, 6, 20)) for _ in range(3)] + [db_object(date=date(2024, 6, 24))])
+
+    async def export(start_date, end_date):
+        response = await export_dynamics_columnar(
+            start_date=start_date, end_date=end_date, format=export_format, session_fabric=session_fabric)
+        body = b''.join([chunk async for chunk in response.body_iterator])
+        if export_format == 'arrow':
+            return pa.ipc.open_stream(body).read_all()
+        return pq.ParquetFile(pa.BufferReader(body)).read(use_threads=False)
+
+    table = await export(date(2024, 6, 20), date(2024, 6, 21))
+    assert table.num_rows == 3
+    assert table.schema.field('volume').type == pa.int64()
+    assert set(table.column('date').to_pylist()) == {date(2024, 6, 20)}
+    assert table.column('exchange_product_name')[0].as_py() == 'Product A'
+
+    empty = await export(date(2024, 1, 1), date(2024, 1, 2))
+    assert empty.num_rows == 0
+    assert empty.schema == table.schema
+
+
+@pytest.mark.asyncio
+async def test_get_trading_results(async_session, db_object, save_objects):
+
+    await save_objects(
         [db_object() for _ in range(3)] + [db_object(oil_id='OIL2'), db_object(date=date(2024, 6, 20))])
-    await async_session.commit()
 
     get_trading_results = cached_get_trading_results.__wrapped__
 
@@ -59,3 +190,332 @@ async def test_get_trading_results(async_session, db_object):
     assert len(result) == 3
     for obj in result:
         assert obj.oil_id == 'OIL1'
+
+
+@pytest.mark.parametrize(
+    'key, expected',
+    [
+        ('spimex-cache::/trading/dynamics?start_date=2024-06-01&end_date=2024-06-30', True),
+        ('spimex-cache::/trading/dynamics?start_date=2024-05-01&end_date=2024-05-31&oil_id=A100', False),
+        ('spimex-cache::/trading/latest-results?oil_id=A100', True),
+        ('spimex-cache::/trading/last-dates?limit=5', True),
+    ]
+)
+def test_is_key_affected(key, expected):
+
+    assert is_key_affected(key, [date(2024, 6, 20)]) is expected
+
+
+class FakeRedis:
+    """Минимальная замена Redis для индекса кэша: строки, множества и транзакции."""
+
+    def __init__(self, keys=()):
+        self.values = dict.fromkeys(keys, b'[]')
+        self.sets, self.zsets = {}, {}
+
+    @staticmethod
+    def encode(key):
+        return key if isinstance(key, bytes) else key.encode()
+
+    def pipeline(self, transaction=True):
+        redis = self
+
+        class Pipeline:
+            calls = []
+
+            def __getattr__(self, name):
+                return lambda *args, **kwargs: self.calls.append((name, args, kwargs))
+
+            async def execute(self):
+                return [await getattr(redis, name)(*args, **kwargs) for name, args, kwargs in self.calls]
+
+            async def __aenter__(self):
+                self.calls = []
+                return self
+
+            async def __aexit__(self, *exc):
+                pass
+
+        return Pipeline()
+
+    async def scan_iter(self, match):
+        for key in list(self.values):
+            if key.startswith(match.rstrip('*').encode()):
+                yield key
+
+    async def set(self, key, value, ex=None):
+        self.values[self.encode(key)] = value
+
+    async def delete(self, *keys):
+        for key in keys:
+            self.values.pop(self.encode(key), None)
+
+    async def sadd(self, name, *keys):
+        self.sets.setdefault(name, set()).update(map(self.encode, keys))
+
+    async def smembers(self, name):
+        return set(self.sets.get(name, ()))
+
+    async def srem(self, name, *keys):
+        self.sets.get(name, set()).difference_update(map(self.encode, keys))
+
+    async def zadd(self, name, mapping):
+        self.zsets.setdefault(name, {}).update({self.encode(key): score for key, score in mapping.items()})
+
+    async def zrangebyscore(self, name, min, max):
+        return [key for key, score in self.zsets.get(name, {}).items() if score >= min]
+
+    async def zrem(self, name, *keys):
+        for key in keys:
+            self.zsets.get(name, {}).pop(self.encode(key), None)
+
+
+@pytest.mark.asyncio
+async def test_evict_cached_dates():
+
+    historical = 'spimex-cache::/trading/dynamics?start_date=2024-01-01&end_date=2024-01-31'
+    current = 'spimex-cache::/trading/dynamics?start_date=2024-06-01&end_date=2024-06-30'
+    last_dates = 'spimex-cache::/trading/last-dates?limit=10'
+    redis = FakeRedis()
+    backend = IndexedRedisBackend(redis)
+    for key in (historical, current, last_dates):
+        await backend.set(key, b'[]')
+
+    local = LocalCache(max_entries=10, ttl=60)
+    local.set(historical, b'[]')
+    local.set('spimex-cache::/trading/latest-results?', b'[]')
+
+    evicted = await evict_cached_dates(redis, [date(2024, 6, 20)], local)
+
+    assert evicted == 2
+    assert set(redis.values) == {historical.encode()}
+    assert redis.zsets[PERIOD_INDEX_KEY] == {historical.encode(): date(2024, 1, 31).toordinal()}
+    assert redis.sets[LATEST_INDEX_KEY] == set()
+    assert list(local.entries) == [historical]
+
+
+@pytest.mark.asyncio
+async def test_index_cached_keys_covers_keys_cached_before_index():
+
+    historical = b'spimex-cache::/trading/dynamics?start_date=2024-01-01&end_date=2024-01-31'
+    redis = FakeRedis([historical, b'spimex-cache::/trading/last-dates?limit=10'])
+
+    await index_cached_keys(redis)
+    assert await evict_cached_dates(redis, [date(2024, 6, 20)]) == 1
+    assert set(redis.values) == {historical}
+
+
+def test_local_cache_is_bounded_lru_with_ttl():
+
+    local = LocalCache(max_entries=2, ttl=60)
+    local.set('a', b'1')
+    local.set('b', b'2')
+    assert local.get('a') == (59, b'1')
+    local.set('c', b'3')
+
+    assert local.get('b') is None
+    assert local.get('a')[1] == b'1'
+
+    local.set('expired', b'4', ttl=0)
+    assert local.get('expired') is None
+    local.set('short', b'5', ttl=10)
+    assert local.get('short')[0] <= 10
+
+
+@pytest.mark.asyncio
+async def test_tiered_backend_counts_hits_per_tier():
+
+    remote = InMemoryBackend()
+    await remote.set('shared', b'value', 30)
+    backend = TieredBackend(LocalCache(max_entries=10, ttl=60), remote)
+
+    assert await backend.get_with_ttl('shared') == (30, b'value')
+    assert (await backend.get_with_ttl('shared'))[1] == b'value'
+    assert await backend.get('missing') is None
+    await backend.set('own', b'other', 30)
+    assert await backend.get('own') == b'other'
+
+    assert backend.stats == {'local_hits': 2, 'local_misses': 2, 'remote_hits': 1, 'remote_misses': 1}
+
+
+@pytest.mark.asyncio
+async def test_coalesce_runs_concurrent_calls_once():
+
+    calls = []
+
+    async def handler(limit: int):
+        calls.append(limit)
+        await asyncio.sleep(0.01)
+        return [limit]
+
+    coalesced = coalesce(handler)
+    results = await asyncio.gather(*[coalesced(limit=limit) for limit in (5, 5, 5, 10)])
+
+    assert results == [[5], [5], [5], [10]]
+    assert sorted(calls) == [5, 10]
+    assert await coalesced(limit=5) == [5]
+    assert len(calls) == 3
+
+
+@pytest.mark.asyncio
+async def test_cached_endpoint_queries_db_once_for_concurrent_misses(
+        monkeypatch, async_session, db_object, save_objects):
+
+    await save_objects([db_object(date=date(2024, 6, 20)), db_object(date=date(2024, 6, 21))])
+
+    queries = []
+
+    def counting_last_dates_query(limit):
+        queries.append(limit)
+        return last_dates_query(limit)
+
+    async def override_session():
+        yield async_session
+
+    monkeypatch.setattr(routers, 'last_dates_query', counting_last_dates_query)
+    backend = TieredBackend(LocalCache(max_entries=10, ttl=60), InMemoryBackend())
+    FastAPICache.init(backend, prefix=CACHE_PREFIX, key_builder=custom_key_builder)
+    app.dependency_overrides[get_async_session] = override_session
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url='http://test') as client:
+            responses = await asyncio.gather(*[client.get('/trading/last-dates?limit=5') for _ in range(5)])
+            responses.append(await client.get('/trading/last-dates?limit=5'))
+    finally:
+        app.dependency_overrides.clear()
+        FastAPICache.reset()
+
+    assert [response.json() for response in responses] == [['2024-06-21', '2024-06-20']] * 6
+    assert queries == [5]
+    assert backend.stats['local_hits'] >= 1
+
+
+@pytest.mark.parametrize('url', [
+    '/trading/dynamics?start_date=2024-06-20&end_date=2024-06-21',
+    '/trading/latest-results?oil_id=OIL1',
+])
+@pytest.mark.asyncio
+async def test_cached_trading_results_match_response_model(async_session, db_object, save_objects, url):
+
+    await save_objects([db_object(), db_object(delivery_basis_id='DB2', delivery_basis_name='Basis B')])
+
+    async def override_session():
+        yield async_session
+
+    backend = InMemoryBackend()
+    await backend.clear(namespace=CACHE_PREFIX)
+    FastAPICache.init(backend, prefix=CACHE_PREFIX, key_builder=custom_key_builder)
+    app.dependency_overrides[get_async_session] = override_session
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url='http://test') as client:
+            miss = await client.get(url)
+            hit = await client.get(url)
+    finally:
+        app.dependency_overrides.clear()
+        FastAPICache.reset()
+
+    assert (miss.status_code, hit.status_code) == (200, 200)
+    assert (miss.headers['x-fastapi-cache'], hit.headers['x-fastapi-cache']) == ('MISS', 'HIT')
+    assert hit.json() == miss.json()
+    assert {item['delivery_basis_name'] for item in hit.json()} == {'Basis A', 'Basis B'}
+    cached = json.loads(await backend.get(f'{CACHE_PREFIX}::{url}'))
+    assert all(set(item) == set(SpimexTradingResultOut.model_fields) for item in cached)
+
+
+@pytest.mark.asyncio
+async def test_metrics_middleware_reports_timings(async_session, db_object, save_objects):
+
+    await save_objects([db_object(date=date(2024, 6, 20)), db_object(date=date(2024, 6, 21))])
+
+    async def override_session():
+        yield async_session
+
+    route = '/trading/last-dates'
+    expected = {
+        ('spimex_api_request_seconds_count', (('method', 'GET'), ('route', route), ('status', '200'))): 2,
+        ('spimex_api_db_queries_total', (('route', route),)): 1,
+        ('spimex_api_cache_responses_total', (('route', route), ('status', 'hit'))): 1,
+        ('spimex_api_cache_lookups_total', (('result', 'local-hit'),)): 1,
+    }
+    before = {key: sample_value(key[0], **dict(key[1])) for key in expected}
+    bytes_before = sample_value('spimex_api_response_bytes_sum', route=route)
+
+    instrument_engine(async_session.bind)
+    backend = TieredBackend(LocalCache(max_entries=10, ttl=60), InMemoryBackend())
+    await backend.clear(namespace=CACHE_PREFIX)
+    FastAPICache.init(backend, prefix=CACHE_PREFIX, key_builder=custom_key_builder)
+    app.dependency_overrides[get_async_session] = override_session
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url='http://test') as client:
+            miss = await client.get('/trading/last-dates?limit=5')
+            hit = await client.get('/trading/last-dates?limit=5')
+            metrics = await client.get('/metrics')
+    finally:
+        app.dependency_overrides.clear()
+        FastAPICache.reset()
+
+    miss_timing = [entry.split(';')[:2] for entry in miss.headers['server-timing'].split(', ')]
+    hit_timing = [entry.split(';')[:2] for entry in hit.headers['server-timing'].split(', ')]
+    assert miss_timing[:3] == [['cache', 'desc="miss"'], ['db', 'desc="queries: 1"'], ['orm', miss_timing[2][1]]]
+    assert [entry[0] for entry in miss_timing[3:]] == ['render', 'total']
+    assert [entry[:2] for entry in hit_timing[:1]] == [['cache', 'desc="local-hit"']]
+    assert [entry[0] for entry in hit_timing[1:]] == ['render', 'total']
+
+    samples = {
+        (sample.name, tuple(sorted(sample.labels.items()))): sample.value
+        for family in text_string_to_metric_families(metrics.text) for sample in family.samples
+    }
+    assert metrics.headers['content-type'] == CONTENT_TYPE_LATEST
+    assert {key: samples[key] - before[key] for key in expected} == expected
+    assert samples[('spimex_api_response_bytes_sum', (('route', route),))] - bytes_before == 2 * len(miss.content)
+
+
+@pytest.mark.asyncio
+async def test_query_accounting_survives_failed_statements(async_session):
+
+    instrument_engine(async_session.bind)
+    timings = RequestTimings()
+    token = _request_timings.set(timings)
+    try:
+        with pytest.raises(Exception):
+            await async_session.execute(text('SELECT * FROM missing_table'))
+        await async_session.rollback()
+        await async_session.execute(text('SELECT 1'))
+        connection = await async_session.connection()
+    finally:
+        _request_timings.reset(token)
+
+    assert timings.db_queries == 1
+    assert 'query_started' not in connection.info
+
+
+def plan_node_types(plan):
+    yield plan['Node Type'], plan.get('Relation Name')
+    for child in plan.get('Plans', []):
+        yield from plan_node_types(child)
+
+
+@pytest.mark.asyncio
+async def test_router_queries_use_indexes(seeded_trading_table):
+
+    statements = [
+        last_dates_query(10),
+        dynamics_query(date(2024, 6, 1), date(2024, 6, 30)),
+        dynamics_query(date(2022, 1, 1), date(2024, 12, 31), oil_id='A001', delivery_type_id='F'),
+        dynamics_query(date(2024, 6, 1), date(2024, 6, 30), delivery_basis_id='B03'),
+        dynamics_page_query(date(2022, 1, 1), date(2024, 12, 31), cursor='MjAyNC0wNi0xNTo1MDA', limit=100),
+        aggregates_query(date(2024, 6, 1), date(2024, 6, 30), group_by=['oil_id'], bucket='week'),
+        latest_results_query(),
+        latest_results_query(oil_id='A001', delivery_type_id='F', delivery_basis_id='B00'),
+    ]
+
+    async with seeded_trading_table() as session:
+        for stmt in statements:
+            sql = stmt.compile(dialect=postgresql.dialect(), compile_kwargs={'literal_binds': True})
+            result = await session.execute(text(f'EXPLAIN (FORMAT JSON) {sql}'))
+            nodes = set(plan_node_types(result.scalar()[0]['Plan']))
+            node_types = {node_type for node_type, _ in nodes}
+            # справочники малы, и планировщик вправе читать их целиком
+            seq_scans = {relation for node_type, relation in nodes if node_type == 'Seq Scan'}
+
+            assert not seq_scans - {'products', 'delivery_bases'}, sql
+            assert {'Index Scan', 'Index Only Scan', 'Bitmap Index Scan'} & node_types, sql
@@ -0,0 +1,62 @@
+from pathlib import Path
+
+import pytest
+import pytest_asyncio
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from core.models import Base
+
+
+@pytest.fixture(scope='session')
+def docker_compose_file():
+    return [str(Path(__file__).parent / 'parser_tests' / 'docker-compose.yml')]
+
+
+@pytest.fixture(scope='session')
+def postgres_service(docker_services):
+    def is_responsive():
+        import psycopg2
+        try:
+            conn = psycopg2.connect(
+                dbname='testdb',
+                user='testuser',
+                password='testpass',
+                host='localhost',
+                port=5433,
+            )
+            conn.close()
+            return True
+        except psycopg2.OperationalError:
+            return False
+
+    docker_services.wait_until_responsive(
+        timeout=30.0,
+        pause=5.0,
+        check=is_responsive
+    )
+    return {
+        'host': '127.0.0.1',
+        'port': 5433,
+        'user': 'testuser',
+        'password': 'testpass',
+        'db': 'testdb',
+    }
+
+
+@pytest_asyncio.fixture
+async def async_test_session(postgres_service):
+
+    dsn = (
+        f'postgresql+asyncpg://{postgres_service["user"]}:'
+        f'{postgres_service["password"]}@{postgres_service["host"]}:'
+        f'{postgres_service["port"]}/{postgres_service["db"]}'
+    )
+    engine = create_async_engine(dsn, echo=False)
+    async_session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    yield async_session
+    await engine.dispose()
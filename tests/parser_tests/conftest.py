@@ -2,14 +2,23 @@ import asyncio
 from datetime import date, datetime, timedelta
 from pathlib import Path
 
+import psycopg2
 import pytest
 import pytest_asyncio
+from alembic import command
+from alembic.config import Config
 from sqlalchemy import delete
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 
-from core.models import Base, SpimexTradingResult
+from core import partitions
+from core.config import settings
+from core.models import (Base, DeliveryBasis, IngestState, Product, SpimexTradingResult, TradingDailyRollup,
+                         TradingDay)
 from core.schemas import SpimexTradingResultSchema
+from core.xls_cache import XlsCache
+
+MIGRATIONS_DIR = Path(__file__).parents[2] / 'alembic'
+MIGRATED_DB = 'migration_test'
 
 
 def prepare_test_case(*input_days, expected_days):
@@ -47,10 +56,11 @@ def mock_xls_files():
 @pytest.fixture
 def mock_response():
     class MockResponse:
-        def __init__(self, text_or_bytes, is_bytes=False):
+        def __init__(self, text_or_bytes, is_bytes=False, status=200, headers=None):
             self._data = text_or_bytes
             self._is_bytes = is_bytes
-            self.status = 200
+            self.status = status
+            self.headers = headers or {}
 
         async def text(self):
             return self._data
@@ -93,6 +103,13 @@ def mock_session(mock_response):
     return MockSession
 
 
+@pytest.fixture
+def xls_cache(tmp_path):
+    def _xls_cache(max_bytes: int = 10 * 1024 ** 2, offline: bool = False):
+        return XlsCache(str(tmp_path / 'xls'), max_bytes, offline=offline)
+    return _xls_cache
+
+
 @pytest.fixture
 def sample_records():
     def _sample_records(date: date = date.today(), rec_count: int = 5):
@@ -115,57 +132,14 @@ def semaphore():
     return asyncio.Semaphore(5)
 
 
-@pytest.fixture(scope='session')
-def docker_compose_file():
-    return [str(Path(__file__).parent / 'docker-compose.yml')]
-
-
-@pytest.fixture(scope='session')
-def postgres_service(docker_services):
-    def is_responsive():
-        import psycopg2
-        try:
-            conn = psycopg2.connect(
-                dbname='testdb',
-                user='testuser',
-                password='testpass',
-                host='localhost',
-                port=5433,
-            )
-            conn.close()
-            return True
-        except psycopg2.OperationalError:
-            return False
-
-    docker_services.wait_until_responsive(
-        timeout=30.0,
-        pause=5.0,
-        check=is_responsive
-    )
-    return {
-        'host': '127.0.0.1',
-        'port': 5433,
-        'user': 'testuser',
-        'password': 'testpass',
-        'db': 'testdb',
-    }
-
-
 @pytest_asyncio.fixture
-async def async_test_session(postgres_service):
-
-    dsn = (
-        f'postgresql+asyncpg://{postgres_service["user"]}:'
-        f'{postgres_service["password"]}@{postgres_service["host"]}:'
-        f'{postgres_service["port"]}/{postgres_service["db"]}'
-    )
-    engine = create_async_engine(dsn, echo=False)
-    async_session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+async def sqlite_session_fabric():
 
+    engine = create_async_engine('sqlite+aiosqlite:///:memory:', echo=False)
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
 
-    yield async_session
+    yield async_sessionmaker(engine, expire_on_commit=False)
     await engine.dispose()
 
 
@@ -173,4 +147,51 @@ async def async_test_session(postgres_service):
 async def clean_db(async_test_session):
     async with async_test_session() as session:
         await session.execute(delete(SpimexTradingResult))
+        await session.execute(delete(IngestState))
+        await session.execute(delete(TradingDay))
+        await session.execute(delete(TradingDailyRollup))
+        await session.execute(delete(Product))
+        await session.execute(delete(DeliveryBasis))
         await session.commit()
+
+
+@pytest_asyncio.fixture
+async def migrated_session_fabric(postgres_service, monkeypatch):
+    """Сессии к отдельной базе, схема которой создана миграциями alembic.
+
+    После теста миграции откатываются до base, затем база удаляется.
+    """
+
+    def execute_autocommit(statement):
+        conn = psycopg2.connect(
+            dbname=postgres_service['db'], user=postgres_service['user'],
+            password=postgres_service['password'], host=postgres_service['host'],
+            port=postgres_service['port'])
+        conn.autocommit = True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(statement)
+        finally:
+            conn.close()
+
+    monkeypatch.setattr(settings, 'POSTGRES_DB', MIGRATED_DB)
+    monkeypatch.setattr(settings, 'DB_HOST', postgres_service['host'])
+    monkeypatch.setattr(settings, 'DB_PORT', postgres_service['port'])
+    monkeypatch.setattr(settings, 'POSTGRES_USER', postgres_service['user'])
+    monkeypatch.setattr(settings, 'POSTGRES_PASSWORD', postgres_service['password'])
+    monkeypatch.setattr(partitions, '_known_partitions', set())
+
+    config = Config()
+    config.set_main_option('script_location', str(MIGRATIONS_DIR))
+
+    execute_autocommit(f'DROP DATABASE IF EXISTS {MIGRATED_DB} WITH (FORCE)')
+    execute_autocommit(f'CREATE DATABASE {MIGRATED_DB}')
+    command.upgrade(config, 'head')
+
+    engine = create_async_engine(settings.DATABASE_URL, echo=False)
+    try:
+        yield async_sessionmaker(engine, expire_on_commit=False)
+    finally:
+        await engine.dispose()
+        command.downgrade(config, 'base')
+        execute_autocommit(f'DROP DATABASE {MIGRATED_DB}')
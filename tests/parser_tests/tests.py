@@ -1,16 +1,30 @@
+import asyncio
+import json
+import os
 from datetime import date
-from unittest.mock import AsyncMock
+from unittest.mock import AsyncMock, Mock
 
-import aiohttp
+import numpy as np
 import pytest
-import requests
-from sqlalchemy import func, select
-
-from core.models import SpimexTradingResult
-from core.schemas import SpimexTradingResultSchema
-from core.utils import (extract_data_from_xls, find_page_bounds_binary,
-                        get_last_page_number, get_xls_links_from_page, input_dates,
-                        parse_all_pages, save_batch, save_data_to_db_async, sync_parse_xls)
+from prometheus_client import CollectorRegistry, Counter, Histogram
+from pydantic import TypeAdapter, ValidationError
+from sqlalchemy import func, select, text
+
+import main as main_module
+from core.concurrency import AdaptiveLimiter, report_overload
+from core.config import settings
+from core import xls_cache as xls_cache_module
+from core.http_client import HttpClient
+from core.metrics import report_run, sample_value, summary
+from core.models import DeliveryBasis, IngestState, Product, SpimexTradingResult, TradingDailyRollup, TradingDay
+from core.partitions import attach_partition, detach_partition, ensure_partitions, is_partitioned, list_partitions
+from core.schemas import SpimexTradingResultSchema, TradingRow, validate_trading_columns
+from core.utils import (INGEST_STATE_NAME, advance_high_water_mark, collect_links_since, copy_batch,
+                        download_and_parse_xls, extract_data_from_xls, find_page_bounds_binary, get_high_water_mark,
+                        get_last_page_number, get_xls_links_from_page, input_dates, parse_all_pages,
+                        parse_listing_items, run_streaming_pipeline, save_batch, save_data_to_db_async,
+                        sync_new_results, sync_parse_xls, sync_parse_xls_columns)
+from tests.parser_tests.benchmarks import legacy_parse_listing_items, legacy_sync_parse_xls
 from tests.parser_tests.conftest import prepare_test_case
 
 from .constants import (EXPECTED_RESULT_1, EXPECTED_RESULT_2, EXPECTED_RESULT_3,
@@ -35,21 +49,98 @@ def test_input_dates(monkeypatch, inputs, expected):
     assert result == expected
 
 
-def test_get_last_page_number(monkeypatch, mock_html_pages):
+@pytest.mark.asyncio
+async def test_get_last_page_number(mock_response, mock_html_pages):
+
+    class ListingSession:
+        def get(self, url):
+            return mock_response(mock_html_pages[1])
 
-    html = mock_html_pages[1]
-    monkeypatch.setattr(requests, 'get', lambda _: type('Resp', (), {'text': html}))
-    result = get_last_page_number()
+    result = await get_last_page_number(HttpClient(ListingSession()))
 
     assert result == 391
 
 
+@pytest.mark.asyncio
+async def test_http_client_retries_transient_errors(mock_response):
+
+    outcomes = [asyncio.TimeoutError(), mock_response('', status=503), mock_response('ok'),
+                mock_response('', status=502), mock_response('', status=503)]
+
+    class FlakySession:
+        def get(self, url):
+            outcome = outcomes.pop(0)
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome
+
+    http = HttpClient(FlakySession(), retries=2, backoff=0)
+    assert (await http.fetch('https://spimex.com', text=True)).body == 'ok'
+
+    http.retries = 1
+    assert (await http.fetch('https://spimex.com', text=True)).status == 503
+
+    assert http.stats == {'requests': 5, 'retries': 3, 'failures': 1}
+
+
+@pytest.mark.asyncio
+async def test_http_client_retries_body_read(mock_response):
+
+    def stalled_response():
+        response = mock_response(b'')
+        response.read = AsyncMock(side_effect=asyncio.TimeoutError())
+        return response
+
+    outcomes = [stalled_response(), mock_response(b'xls', is_bytes=True), stalled_response(), stalled_response()]
+
+    class StallingSession:
+        def get(self, url, **kwargs):
+            return outcomes.pop(0)
+
+    http = HttpClient(StallingSession(), retries=1, backoff=0)
+    result = await http.fetch('https://spimex.com/file.xls')
+    assert (result.status, result.body) == (200, b'xls')
+
+    with pytest.raises(asyncio.TimeoutError):
+        await http.fetch('https://spimex.com/file.xls')
+
+    assert http.stats == {'requests': 4, 'retries': 2, 'failures': 1}
+
+
+@pytest.mark.asyncio
+async def test_adaptive_limiter():
+
+    limiter = AdaptiveLimiter(2, max_limit=8, latency_tolerance=10)
+    peak = 0
+
+    async def work(overloaded=False):
+        nonlocal peak
+        async with limiter:
+            peak = max(peak, limiter.in_flight)
+            await asyncio.sleep(0.01)
+            if overloaded:
+                report_overload()
+
+    tasks = [asyncio.create_task(work()) for _ in range(60)]
+    await asyncio.sleep(0)
+    assert limiter.queue_depth == 58
+
+    await asyncio.gather(*tasks)
+    grown = limiter.limit
+    assert 2 < grown <= 8
+    assert peak <= 8
+
+    await asyncio.gather(*[work(overloaded=True) for _ in range(grown)])
+    assert limiter.limit == max(1, grown // 2)
+    assert limiter.queue_depth == limiter.in_flight == 0
+
+
 @pytest.mark.asyncio
 async def test_find_page_bounds_binary(mock_session, mock_html_pages):
 
     async with mock_session(mock_html_pages) as session:
         start, end = await find_page_bounds_binary(
-            session=session, total_pages=5,
+            session=HttpClient(session), total_pages=5,
             cutoff_start_date=date(2025, 4, 22), cutoff_end_date=date(2025, 6, 2)
         )
 
@@ -69,7 +160,7 @@ async def test_get_xls_links_from_page(mock_session, mock_html_pages,
                                        start_date, end_date, expected_result, expected_flag):
 
     links, stop_flag = await get_xls_links_from_page(
-        session=mock_session(mock_html_pages),
+        session=HttpClient(mock_session(mock_html_pages)),
         url='https://spimex.com/markets/oil_products/trades/results/?page=page-1',
         cutoff_start_date=start_date,
         cutoff_end_date=end_date,
@@ -80,6 +171,21 @@ async def test_get_xls_links_from_page(mock_session, mock_html_pages,
     assert stop_flag == expected_flag
 
 
+@pytest.mark.parametrize('page', [1, 2, 3, 4, 5])
+def test_parse_listing_items_matches_beautifulsoup(mock_html_pages, page):
+
+    items = parse_listing_items(mock_html_pages[page])
+
+    assert items == legacy_parse_listing_items(mock_html_pages[page])
+    assert any(item.href and 'reports' in item.href and item.date for item in items)
+
+
+def test_parse_listing_items_empty_page():
+
+    assert parse_listing_items('') == []
+    assert parse_listing_items('<html><body><p>Нет данных</p></body></html>') == []
+
+
 @pytest.mark.parametrize(
     'start_date, end_date, expected_result',
     [
@@ -91,13 +197,13 @@ async def test_get_xls_links_from_page(mock_session, mock_html_pages,
 @pytest.mark.asyncio
 async def test_parse_all_pages(monkeypatch, mock_session, mock_html_pages, start_date, end_date, expected_result):
 
-    monkeypatch.setattr('core.utils.get_last_page_number', lambda: 3)
+    monkeypatch.setattr('core.utils.get_last_page_number', AsyncMock(return_value=3))
     monkeypatch.setattr('core.utils.find_page_bounds_binary', AsyncMock(return_value=(1, 3)))
-    monkeypatch.setattr(aiohttp, 'ClientSession', lambda: mock_session(mock_html_pages))
 
     result = await parse_all_pages(
         cutoff_start_date=start_date,
         cutoff_end_date=end_date,
+        http=HttpClient(mock_session(mock_html_pages)),
     )
 
     assert all(isinstance(item, tuple) for item in result)
@@ -105,6 +211,31 @@ async def test_parse_all_pages(monkeypatch, mock_session, mock_html_pages, start
     assert result == expected_result
 
 
+@pytest.mark.asyncio
+async def test_parse_all_pages_fetches_each_page_once(mock_session, mock_html_pages):
+
+    requested = []
+
+    class CountingSession(mock_session):
+        def get(self, url):
+            requested.append(url)
+            return super().get(url)
+
+    html_by_page = dict(mock_html_pages)
+    html_by_page[1] = html_by_page[1].replace('<span>391</span>', f'<span>{len(mock_html_pages)}</span>')
+
+    result = await parse_all_pages(
+        cutoff_start_date=date(2025, 5, 6),
+        cutoff_end_date=date(2025, 6, 24),
+        http=HttpClient(CountingSession(html_by_page)),
+    )
+
+    assert set(EXPECTED_RESULT_3) <= set(result)
+    assert all(date(2025, 5, 6) <= item[1] <= date(2025, 6, 24) for item in result)
+    assert requested[0].endswith('page-1')
+    assert len(requested) == len(set(requested))
+
+
 def test_sync_parse_xls(mock_xls_files):
 
     file_path = mock_xls_files[0][0]
@@ -125,14 +256,197 @@ def test_sync_parse_xls(mock_xls_files):
         assert row['date'] == xls_date
 
 
+def test_sync_parse_xls_matches_legacy(mock_xls_files):
+
+    for file_path, xls_date in mock_xls_files:
+        content = file_path.read_bytes()
+
+        assert sync_parse_xls(content, xls_date) == legacy_sync_parse_xls(content, xls_date)
+
+
+def test_validate_trading_columns_matches_schema(mock_xls_files):
+
+    adapter = TypeAdapter(list[SpimexTradingResultSchema])
+    for file_path, xls_date in mock_xls_files:
+        content = file_path.read_bytes()
+        columns = sync_parse_xls_columns(content, xls_date)
+        expected = adapter.validate_python(sync_parse_xls(content, xls_date))
+
+        assert all(column.dtype != object for column in columns.values())
+        assert list(validate_trading_columns(columns, xls_date)) == [record.to_row() for record in expected]
+
+
+def test_validate_trading_columns_matches_schema_on_random_rows():
+
+    rng = np.random.default_rng(15)
+    alphabet = list('ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789')
+    numbers = [60.0, 4143900.0, 1.0, 0.0, 2.5, np.nan, 1e12]
+    for _ in range(300):
+        row = {
+            'exchange_product_id': ''.join(rng.choice(alphabet, rng.integers(0, 13))),
+            'exchange_product_name': rng.choice(['Бензин (АИ-92-К5)', '']),
+            'delivery_basis_name': rng.choice(['НБ Абаканская', '']),
+            'volume': rng.choice(numbers),
+            'total': rng.choice(numbers),
+            'count': rng.choice(numbers),
+        }
+        columns = {
+            name: np.array([value], dtype=str if isinstance(value, str) else np.float64)
+            for name, value in row.items()
+        }
+        try:
+            expected = SpimexTradingResultSchema(
+                date=date(2025, 6, 10),
+                **{name: None if value == '' or value != value else value for name, value in row.items()},
+            ).to_row()
+        except ValidationError:
+            with pytest.raises(ValueError):
+                list(validate_trading_columns(columns, date(2025, 6, 10)))
+        else:
+            assert list(validate_trading_columns(columns, date(2025, 6, 10))) == [expected]
+
+
+def test_xlrd_reader_matches_pandas(mock_xls_files):
+
+    for file_path, xls_date in mock_xls_files:
+        content = file_path.read_bytes()
+        expected = sync_parse_xls_columns(content, xls_date, reader='pandas')
+        columns = sync_parse_xls_columns(content, xls_date, reader='xlrd')
+
+        assert columns.keys() == expected.keys()
+        for name, values in columns.items():
+            assert values.dtype == expected[name].dtype
+            np.testing.assert_array_equal(values, expected[name])
+
+
+def test_validate_trading_columns_rejects_invalid_values(mock_xls_files):
+
+    file_path, xls_date = mock_xls_files[0]
+    columns = sync_parse_xls_columns(file_path.read_bytes(), xls_date)
+    columns['total'][0] = np.nan
+
+    with pytest.raises(ValueError):
+        validate_trading_columns(columns, xls_date)
+
+
 @pytest.mark.asyncio
-async def test_extract_data_from_xls(monkeypatch, mock_session, mock_xls_files):
+async def test_extract_data_from_xls(mock_session, mock_xls_files):
 
-    monkeypatch.setattr(aiohttp, 'ClientSession', lambda: mock_session(file_mode=True))
-    results = await extract_data_from_xls(mock_xls_files)
+    results = await extract_data_from_xls(mock_xls_files, http=HttpClient(mock_session(file_mode=True)))
 
     assert len(set(row.date for row in results)) == 3
-    assert all(isinstance(row, SpimexTradingResultSchema) for row in results)
+    assert all(isinstance(row, TradingRow) for row in results)
+
+
+def test_metrics_summary():
+
+    metrics = CollectorRegistry()
+    requests = Counter('test_requests', 'Запросы', ['route'], registry=metrics)
+    latency = Histogram('test_latency_seconds', 'Задержка', ['route'], buckets=(0.1, 1.0), registry=metrics)
+    requests.labels(route='/a').inc()
+    requests.labels(route='/a').inc(2)
+    for value in (0.05, 0.5, 5.0):
+        latency.labels(route='/a').observe(value)
+
+    assert summary(metrics)['metrics'] == {
+        'test_requests': {'{route="/a"}': 3},
+        'test_latency_seconds': {'{route="/a"}': {'count': 3, 'sum': 5.55, 'mean': 1.85}},
+    }
+
+
+@pytest.mark.asyncio
+async def test_extract_data_from_xls_records_metrics(mock_session, mock_xls_files, tmp_path):
+
+    stages = ('xls_download', 'xls_parse', 'validate')
+    before = {stage: sample_value('spimex_pipeline_stage_seconds_count', stage=stage) for stage in stages}
+    steps_before = sample_value('spimex_pipeline_step_seconds_count', step='extract_data_from_xls')
+    rows_before = sample_value('spimex_pipeline_rows_total', stage='parsed')
+
+    results = await extract_data_from_xls(mock_xls_files, http=HttpClient(mock_session(file_mode=True)))
+    run_summary = report_run(str(tmp_path / 'metrics.json'))
+    report_run(str(tmp_path / 'metrics.prom'))
+
+    for stage in stages:
+        assert sample_value('spimex_pipeline_stage_seconds_count', stage=stage) - before[stage] == len(mock_xls_files)
+    assert sample_value('spimex_pipeline_step_seconds_count', step='extract_data_from_xls') - steps_before == 1
+    rows = sample_value('spimex_pipeline_rows_total', stage='parsed')
+    assert rows - rows_before == len(results)
+    assert sample_value('spimex_pipeline_queue_depth', queue='parse_pool') == 0
+    assert sample_value('spimex_pipeline_queue_depth', queue='downloads') == 0
+    assert sample_value('spimex_pipeline_queue_depth_max', queue='parse_pool') >= 1
+    assert json.loads((tmp_path / 'metrics.json').read_text(encoding='utf-8')) == json.loads(json.dumps(run_summary))
+    assert f'spimex_pipeline_rows_total{{stage="parsed"}} {rows}' in (
+        tmp_path / 'metrics.prom').read_text(encoding='utf-8').splitlines()
+
+
+@pytest.mark.asyncio
+async def test_xls_cache_conditional_get(mock_response, xls_cache):
+
+    requests_headers = []
+
+    class ConditionalSession:
+        def get(self, url, headers=None):
+            requests_headers.append(headers)
+            if headers.get('If-None-Match') == '"v1"':
+                return mock_response(b'', is_bytes=True, status=304)
+            return mock_response(b'content', is_bytes=True, headers={'ETag': '"v1"'})
+
+    url = 'https://spimex.com/upload/reports/oil_xls/oil_xls_20250610162000.xls'
+    http = HttpClient(ConditionalSession())
+    with xls_cache() as cache:
+        first = await cache.fetch(http, f'{url}?r=1', date(2025, 6, 10))
+    second = await xls_cache().fetch(http, f'{url}?r=2', date(2025, 6, 10))
+
+    assert first == second == b'content'
+    assert requests_headers == [{}, {'If-None-Match': '"v1"'}]
+
+
+@pytest.mark.asyncio
+async def test_xls_cache_evicts_least_recently_used(xls_cache):
+
+    cache = xls_cache(max_bytes=10)
+    await cache.put('https://spimex.com/a.xls', date(2025, 6, 10), b'aaaa')
+    await cache.put('https://spimex.com/b.xls', date(2025, 6, 11), b'bbbb')
+    await cache.get('https://spimex.com/a.xls', date(2025, 6, 10))
+    await cache.put('https://spimex.com/c.xls', date(2025, 6, 16), b'cccc')
+
+    assert cache.size == 8
+    assert await cache.get('https://spimex.com/b.xls', date(2025, 6, 11)) is None
+    assert await cache.get('https://spimex.com/a.xls', date(2025, 6, 10)) == b'aaaa'
+
+
+@pytest.mark.asyncio
+async def test_xls_cache_survives_killed_run(monkeypatch, xls_cache, tmp_path):
+
+    monkeypatch.setattr(xls_cache_module, 'INDEX_SAVE_INTERVAL', 2)
+    cache = xls_cache()
+    for i in range(3):
+        await cache.put(f'https://spimex.com/{i}.xls', date(2025, 6, 10 + i), f'content {i}'.encode())
+    orphan = cache._blob_path(cache.index[cache.make_key('https://spimex.com/2.xls', date(2025, 6, 12))]['sha256'])
+    os.utime(orphan, (0, 0))
+
+    reopened = xls_cache()
+
+    assert [xls_date for _, xls_date in reopened.links(date(2025, 6, 1), date(2025, 6, 30))] == [
+        date(2025, 6, 10), date(2025, 6, 11)]
+    assert not orphan.exists()
+    assert sorted(path.name for path in (tmp_path / 'xls' / 'objects').glob('*/*')) == sorted(
+        entry['sha256'] for entry in reopened.index.values())
+
+
+@pytest.mark.asyncio
+async def test_extract_data_from_xls_offline(mock_xls_files, xls_cache):
+
+    with xls_cache() as cache:
+        for file_path, xls_date in mock_xls_files:
+            await cache.put(f'https://spimex.com/{file_path.name}', xls_date, file_path.read_bytes())
+
+    offline_cache = xls_cache(offline=True)
+    links = offline_cache.links(date(2025, 6, 1), date(2025, 6, 11))
+    results = await extract_data_from_xls(links, cache=offline_cache)
+
+    assert [xls_date for _, xls_date in links] == [date(2025, 6, 10), date(2025, 6, 11)]
+    assert {row.date for row in results} == {date(2025, 6, 10), date(2025, 6, 11)}
 
 
 @pytest.mark.asyncio
@@ -148,6 +462,167 @@ async def test_save_batch(async_test_session, clean_db, sample_records, semaphor
     assert count == len(batch)
 
 
+@pytest.mark.asyncio
+async def test_copy_batch(async_test_session, clean_db, sample_records, semaphore):
+
+    batch = sample_records()
+    saved_count = await copy_batch(batch, semaphore, session_fabric=async_test_session)
+    async with async_test_session() as session:
+        result = await session.execute(select(SpimexTradingResult).order_by(SpimexTradingResult.id))
+        saved = result.scalars().all()
+
+    assert saved_count == len(batch)
+    assert [row.exchange_product_id for row in saved] == [record.exchange_product_id for record in batch]
+    assert [row.oil_id for row in saved] == [record.oil_id for record in batch]
+    assert all(row.created_on is not None for row in saved)
+
+
+@pytest.mark.parametrize('saver', [save_batch, copy_batch])
+@pytest.mark.asyncio
+async def test_batch_upserts_by_natural_key(async_test_session, clean_db, sample_records, semaphore, saver):
+
+    batch = sample_records(date=date(2025, 6, 10), rec_count=3)
+    await saver(batch, semaphore, session_fabric=async_test_session)
+
+    updated = sample_records(date=date(2025, 6, 10), rec_count=4)
+    for record in updated:
+        record.volume = 200
+    saved_count = await saver(updated + updated[:1], semaphore, session_fabric=async_test_session)
+
+    async with async_test_session() as session:
+        result = await session.execute(select(SpimexTradingResult.volume))
+        volumes = result.scalars().all()
+
+    assert saved_count == 4
+    assert volumes == [200] * 4
+
+
+@pytest.mark.parametrize('saver', [save_batch, copy_batch])
+@pytest.mark.asyncio
+async def test_batch_refreshes_trading_days(async_test_session, clean_db, sample_records, semaphore, saver):
+
+    records = sample_records(date=date(2025, 6, 10), rec_count=6)
+    await asyncio.gather(*[
+        saver(records[i:i + 2], semaphore, session_fabric=async_test_session) for i in range(0, 6, 2)
+    ])
+    await saver(records[:2] + sample_records(date=date(2025, 6, 11), rec_count=1),
+                semaphore, session_fabric=async_test_session)
+
+    async with async_test_session() as session:
+        result = await session.execute(select(TradingDay).order_by(TradingDay.date))
+        days = [(day.date, day.row_count, day.total_volume, day.total_value) for day in result.scalars()]
+        result = await session.execute(
+            select(
+                TradingDailyRollup.date, func.count(), func.sum(TradingDailyRollup.row_count),
+                func.sum(TradingDailyRollup.volume), func.sum(TradingDailyRollup.total),
+            ).group_by(TradingDailyRollup.date).order_by(TradingDailyRollup.date)
+        )
+        rollups = [tuple(row) for row in result]
+
+    assert days == [(date(2025, 6, 10), 6, 600, 6000), (date(2025, 6, 11), 1, 100, 1000)]
+    assert rollups == [(date(2025, 6, 10), 6, 6, 600, 6000), (date(2025, 6, 11), 1, 1, 100, 1000)]
+
+
+@pytest.mark.parametrize('saver', [save_batch, copy_batch])
+@pytest.mark.asyncio
+async def test_batch_deduplicates_dimensions(async_test_session, clean_db, sample_records, semaphore, saver):
+
+    await asyncio.gather(*[
+        saver(sample_records(date=date(2025, 6, day), rec_count=3), semaphore, session_fabric=async_test_session)
+        for day in (10, 11)
+    ])
+    renamed = sample_records(date=date(2025, 6, 12), rec_count=1)
+    renamed[0].exchange_product_name = 'Renamed Product'
+    await saver(renamed, semaphore, session_fabric=async_test_session)
+
+    async with async_test_session() as session:
+        products = (await session.execute(
+            select(Product.exchange_product_id, Product.exchange_product_name).order_by(Product.id))).all()
+        bases = (await session.execute(select(DeliveryBasis.delivery_basis_name))).scalars().all()
+        result = await session.execute(
+            select(SpimexTradingResult).where(SpimexTradingResult.exchange_product_id == 'ID0')
+            .order_by(SpimexTradingResult.date))
+        names = [(row.exchange_product_name, row.delivery_basis_name) for row in result.scalars()]
+
+    assert sorted(products) == [
+        ('ID0', 'Renamed Product'), ('ID0', 'Test Product'), ('ID1', 'Test Product'), ('ID2', 'Test Product')]
+    assert bases == ['Test Basis']
+    assert names == [('Test Product', 'Test Basis')] * 2 + [('Renamed Product', 'Test Basis')]
+
+
+@pytest.mark.asyncio
+async def test_yearly_partitions(async_test_session):
+
+    table = 'partition_test'
+    async with async_test_session() as session:
+        await session.execute(text(f'DROP TABLE IF EXISTS {table}, {table}_y2024, {table}_y2025 CASCADE'))
+        await session.execute(text(f'CREATE TABLE {table} (id integer, date date) PARTITION BY RANGE (date)'))
+        await session.execute(text(f'CREATE TABLE {table}_default PARTITION OF {table} DEFAULT'))
+        await session.execute(text(f"INSERT INTO {table} VALUES (1, '2023-05-01')"))
+        await session.commit()
+
+    try:
+        async with async_test_session() as session:
+            assert await is_partitioned(session, table)
+            assert not await is_partitioned(session, 'spimex_trading_results')
+
+            await ensure_partitions(session, [date(2023, 6, 1), date(2024, 5, 1), date(2025, 1, 2)], table=table)
+            await session.execute(text(f"INSERT INTO {table} VALUES (2, '2024-05-01'), (3, '2025-01-02')"))
+            await session.commit()
+
+            assert [name for name, _ in await list_partitions(session, table)] == [
+                f'{table}_default', f'{table}_y2024', f'{table}_y2025']
+            rows = await session.execute(text(f'SELECT tableoid::regclass::text, id FROM {table} ORDER BY id'))
+            assert rows.all() == [(f'{table}_default', 1), (f'{table}_y2024', 2), (f'{table}_y2025', 3)]
+
+            assert await detach_partition(session, 2024, table=table) == f'{table}_y2024'
+            await session.commit()
+            assert (await session.execute(text(f'SELECT count(*) FROM {table}'))).scalar() == 2
+
+            await attach_partition(session, 2024, table=table)
+            await session.commit()
+            assert (await session.execute(text(f'SELECT count(*) FROM {table}'))).scalar() == 3
+    finally:
+        async with async_test_session() as session:
+            await session.execute(text(f'DROP TABLE IF EXISTS {table}, {table}_y2024 CASCADE'))
+            await session.commit()
+
+
+@pytest.mark.parametrize('saver', [save_batch, copy_batch])
+@pytest.mark.asyncio
+async def test_savers_on_partitioned_table(migrated_session_fabric, sample_records, semaphore, saver):
+
+    dec_31, jan_1 = date(2024, 12, 31), date(2025, 1, 1)
+    batch = sample_records(date=dec_31, rec_count=3) + sample_records(date=jan_1, rec_count=2)
+    assert await saver(batch, semaphore, session_fabric=migrated_session_fabric) == 5
+
+    updated = [record.model_copy(update={'volume': 200}) for record in sample_records(date=jan_1, rec_count=3)]
+    assert await saver(updated, semaphore, session_fabric=migrated_session_fabric) == 3
+
+    async with migrated_session_fabric() as session:
+        assert await is_partitioned(session)
+        rows = await session.execute(text(
+            'SELECT tableoid::regclass::text, date, count(*), sum(volume) FROM spimex_trading_results '
+            'GROUP BY 1, 2 ORDER BY 2'))
+        assert rows.all() == [
+            ('spimex_trading_results_y2024', dec_31, 3, 300),
+            ('spimex_trading_results_y2025', jan_1, 3, 600),
+        ]
+        days = await session.execute(select(TradingDay.date).order_by(TradingDay.date))
+        assert days.scalars().all() == [dec_31, jan_1]
+
+
+@pytest.mark.asyncio
+async def test_copy_batch_falls_back_on_sqlite(sqlite_session_fabric, sample_records, semaphore):
+
+    batch = sample_records()
+    saved_count = await copy_batch(batch, semaphore, session_fabric=sqlite_session_fabric)
+    async with sqlite_session_fabric() as session:
+        count = (await session.execute(select(func.count()).select_from(SpimexTradingResult))).scalar()
+
+    assert saved_count == count == len(batch)
+
+
 @pytest.mark.asyncio
 async def test_save_data_to_db_async(async_test_session, clean_db, sample_records, semaphore):
 
@@ -164,3 +639,180 @@ async def test_save_data_to_db_async(async_test_session, clean_db, sample_record
         final_count = count_result.scalar()
 
     assert final_count == 2
+
+
+@pytest.mark.asyncio
+async def test_download_limiter_released_before_parsing(mock_session, mock_xls_files):
+
+    limiter = AdaptiveLimiter(1, name='downloads')
+    in_flight = []
+
+    class RecordingPool:
+        async def coro_apply(self, func, args):
+            in_flight.append(limiter.in_flight)
+            return func(*args)
+
+    path, xls_date = mock_xls_files[0]
+    records = await download_and_parse_xls(
+        HttpClient(mock_session(file_mode=True)), RecordingPool(), str(path), xls_date, limiter=limiter)
+
+    assert records
+    assert in_flight == [0]
+
+
+@pytest.mark.asyncio
+async def test_run_streaming_pipeline(monkeypatch, mock_session, mock_xls_files):
+
+    links = [(str(path), xls_date) for path, xls_date in mock_xls_files]
+    saved_batches = []
+
+    async def fake_save_batch(batch, semaphore, session_fabric):
+        saved_batches.append(batch)
+        return len(batch)
+
+    monkeypatch.setattr('core.utils.get_last_page_number', AsyncMock(return_value=1))
+    monkeypatch.setattr('core.utils.find_page_bounds_binary', AsyncMock(return_value=(1, 1)))
+    monkeypatch.setattr('core.utils.get_xls_links_from_page', AsyncMock(return_value=(links, True)))
+    monkeypatch.setattr('core.utils.advance_high_water_mark', AsyncMock())
+
+    limiters = {}
+
+    class RecordingLimiter(AdaptiveLimiter):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.entered = 0
+            limiters[self.name] = self
+
+        async def __aenter__(self):
+            self.entered += 1
+            return await super().__aenter__()
+
+    monkeypatch.setattr('core.utils.AdaptiveLimiter', RecordingLimiter)
+
+    total_saved = await run_streaming_pipeline(
+        date(2025, 6, 10), date(2025, 6, 16), batch_size=50, queue_size=1, download_workers=2,
+        saver=fake_save_batch, http=HttpClient(mock_session(file_mode=True)))
+
+    downloads = limiters['downloads']
+    assert (downloads.max_limit, downloads.entered) == (2, len(links))
+
+    saved = [record for batch in saved_batches for record in batch]
+    assert total_saved == len(saved)
+    assert all(len(batch) <= 50 for batch in saved_batches)
+    assert {record.date for record in saved} == {date(2025, 6, 10), date(2025, 6, 11), date(2025, 6, 16)}
+
+
+@pytest.mark.asyncio
+async def test_run_streaming_pipeline_reports_failed_downloads(monkeypatch, mock_session, mock_xls_files, tmp_path):
+
+    links = [(str(tmp_path / 'missing.xls'), date(2025, 6, 10)), (str(mock_xls_files[1][0]), date(2025, 6, 11))]
+    advance = AsyncMock()
+
+    async def fake_save_batch(batch, semaphore, session_fabric):
+        return len(batch)
+
+    monkeypatch.setattr('core.utils.get_last_page_number', AsyncMock(return_value=1))
+    monkeypatch.setattr('core.utils.find_page_bounds_binary', AsyncMock(return_value=(1, 1)))
+    monkeypatch.setattr('core.utils.get_xls_links_from_page', AsyncMock(return_value=(links, True)))
+    monkeypatch.setattr('core.utils.advance_high_water_mark', advance)
+
+    await run_streaming_pipeline(
+        date(2025, 6, 10), date(2025, 6, 16), download_workers=2,
+        saver=fake_save_batch, http=HttpClient(mock_session(file_mode=True)))
+
+    saved_dates, failed_dates, _ = advance.await_args.args
+    assert saved_dates == {date(2025, 6, 11)}
+    assert failed_dates == {date(2025, 6, 10)}
+
+
+@pytest.mark.asyncio
+async def test_collect_links_since(mock_session, mock_html_pages):
+
+    session = mock_session(mock_html_pages)
+    requested_urls = []
+    get = session.get
+    session.get = lambda url: requested_urls.append(url) or get(url)
+
+    links = await collect_links_since(HttpClient(session), date(2025, 6, 16))
+
+    assert links == list(reversed(EXPECTED_RESULT_1[:5]))
+    assert len(requested_urls) == 1
+
+
+@pytest.mark.asyncio
+async def test_sync_new_results_stops_on_failed_listing_page(monkeypatch, mock_session, mock_html_pages):
+
+    session = mock_session(mock_html_pages)
+    get = session.get
+
+    def get_or_fail(url):
+        if url.endswith('page-2'):
+            raise asyncio.TimeoutError()
+        return get(url)
+
+    session.get = get_or_fail
+    extract = AsyncMock(return_value=[])
+    saver = AsyncMock(return_value=0)
+    monkeypatch.setattr('core.utils.get_high_water_mark', AsyncMock(return_value=date(2025, 4, 1)))
+    monkeypatch.setattr('core.utils.extract_data_from_xls', extract)
+
+    with pytest.raises(asyncio.TimeoutError):
+        await collect_links_since(HttpClient(session, retries=0), date(2025, 4, 1))
+    assert await sync_new_results(saver=saver, http=HttpClient(session, retries=0)) == 0
+    extract.assert_not_awaited()
+    saver.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_main_closes_parse_pool_on_failure(monkeypatch, tmp_path):
+
+    close_parse_pool = Mock()
+    monkeypatch.setattr(settings, 'XLS_CACHE_DIR', str(tmp_path / 'xls'))
+    monkeypatch.setattr(main_module, 'sync_new_results', AsyncMock(side_effect=RuntimeError('boom')))
+    monkeypatch.setattr(main_module, 'close_parse_pool', close_parse_pool)
+
+    with pytest.raises(RuntimeError):
+        await main_module.main(sync=True)
+
+    close_parse_pool.assert_called_once_with()
+
+
+@pytest.mark.asyncio
+async def test_high_water_mark(async_test_session, clean_db, sample_records, semaphore):
+
+    assert await get_high_water_mark(async_test_session) is None
+
+    await save_batch(sample_records(date=date(2025, 6, 10)), semaphore, session_fabric=async_test_session)
+    assert await get_high_water_mark(async_test_session) == date(2025, 6, 10)
+
+    await advance_high_water_mark(
+        {date(2025, 6, 11), date(2025, 6, 16)}, {date(2025, 6, 12)}, session_fabric=async_test_session)
+    assert await get_high_water_mark(async_test_session) == date(2025, 6, 11)
+
+    await advance_high_water_mark({date(2025, 6, 1)}, set(), session_fabric=async_test_session)
+    assert await get_high_water_mark(async_test_session) == date(2025, 6, 11)
+
+
+@pytest.mark.asyncio
+async def test_failed_download_holds_high_water_mark(
+        async_test_session, clean_db, mock_session, mock_xls_files, semaphore, tmp_path):
+
+    (path_10, date_10), (path_11, date_11) = mock_xls_files[:2]
+    links = [(str(tmp_path / 'missing.xls'), date_10), (str(path_11), date_11)]
+
+    failed_dates = set()
+    results = await extract_data_from_xls(
+        links, http=HttpClient(mock_session(file_mode=True)), failed_dates=failed_dates)
+    saved = await save_data_to_db_async(
+        results, session_fabric=async_test_session, failed_dates=failed_dates)
+
+    assert failed_dates == {date_10}
+    assert saved == len(results) > 0
+    assert {row.date for row in results} == {date_11}
+    async with async_test_session() as session:
+        assert await session.get(IngestState, INGEST_STATE_NAME) is None
+
+    retried = await extract_data_from_xls(
+        [(str(path_10), date_10)], http=HttpClient(mock_session(file_mode=True)))
+    await save_data_to_db_async(retried, session_fabric=async_test_session)
+    assert await get_high_water_mark(async_test_session) == date_10